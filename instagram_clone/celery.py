@@ -4,6 +4,8 @@ from django.conf import settings
 
 from celery import Celery
 
+import shared.task_metrics  # noqa: F401  connects the latency signal handlers
+
 # Set the default Django settings module for the 'celery' program.
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'instagram_clone.settings')
 
@@ -16,7 +18,7 @@ app = Celery('instagram_clone')
 app.config_from_object('django.conf:settings', namespace='CELERY')
 
 # Load task modules from all registered Django apps.
-app.autodiscover_tasks(['users'])
+app.autodiscover_tasks(['users', 'posts'])
 
 
 @app.task(bind=True, ignore_result=True)
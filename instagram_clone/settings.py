@@ -10,7 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 from pathlib import Path
-from decouple import config
+from decouple import config, Csv
 import os
 from datetime import timedelta
 
@@ -39,6 +39,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     # Packages
     'rest_framework',
@@ -95,10 +96,15 @@ SIMPLE_JWT = {
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': ['rest_framework_simplejwt.authentication.JWTAuthentication'],
     'DEFAULT_PERMISSION_CLASSES': ['rest_framework.permissions.IsAuthenticated'],
+    'DEFAULT_RENDERER_CLASSES': [
+        'shared.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'shared.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -142,6 +148,61 @@ DATABASES = {
     }
 }
 
+# Each worker process has its own pool (psycopg 3) of DB_POOL_MAX_SIZE connections, capped to this app's share of
+# the server's connections: WEB_CONCURRENCY * max_size <= DB_MAX_CONNECTIONS. Pool stats: /metrics/db-pool/.
+# Under WSGI a worker serves WEB_THREADS requests at a time, one connection each, which is the default size. Under
+# ASGI concurrency per worker is not bounded by threads: every request running sync code (sync views, sync_to_async)
+# gets a thread of its own. Set DB_POOL_MAX_SIZE to the concurrent database work a worker should do; requests beyond
+# it wait up to DB_POOL_TIMEOUT for a connection.
+WEB_CONCURRENCY = config('WEB_CONCURRENCY', default=1, cast=int)  # worker processes
+WEB_THREADS = config('WEB_THREADS', default=1, cast=int)  # request threads per worker
+DB_MAX_CONNECTIONS = config('DB_MAX_CONNECTIONS', default=100, cast=int)
+DB_POOL_MAX_SIZE = config('DB_POOL_MAX_SIZE', default=WEB_THREADS, cast=int)  # connections per worker
+
+if config('DB_POOL', default=True, cast=bool):
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': 1,
+            'max_size': max(1, min(DB_POOL_MAX_SIZE, DB_MAX_CONNECTIONS // WEB_CONCURRENCY)),
+            'timeout': config('DB_POOL_TIMEOUT', default=10, cast=float),  # seconds a request waits for a connection
+            'max_idle': 300,
+        },
+    }
+else:
+    # Without the pool: persistent connections, checked before reuse.
+    DATABASES['default']['CONN_MAX_AGE'] = 600
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+
+# Read replicas of the primary, e.g. DB_REPLICA_HOSTS=replica1,replica2. See shared/db_router.py.
+DATABASE_REPLICAS = []
+for number, host in enumerate(config('DB_REPLICA_HOSTS', default='', cast=Csv()), start=1):
+    DATABASES[f'replica_{number}'] = {**DATABASES['default'], 'HOST': host, 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(f'replica_{number}')
+
+DATABASE_ROUTERS = ['shared.db_router.PrimaryReplicaRouter']
+# Reads of a user who wrote within this many seconds stay on the primary. The writes are recorded in a cache shared by
+# all workers (Redis at REDIS_URL); with replicas a per-process cache fails the startup, see shared/db_router.py.
+REPLICA_STICKY_SECONDS = 5
+REPLICA_STICKY_CACHE = 'replica_sticky'
+REPLICA_HEALTH_CHECK_INTERVAL = 10
+
+# 'replica_sticky' and 'task_metrics' are written and read by different processes: Redis at REDIS_URL. The LocMem
+# fallback only passes the startup checks in setups that run in one process (no replicas, eager Celery tasks).
+SHARED_CACHE = {
+    'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+    'LOCATION': config('REDIS_URL'),
+    'KEY_PREFIX': 'instagram_clone',
+} if config('REDIS_URL', default='') else {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+}
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'replica_sticky': SHARED_CACHE,
+    'task_metrics': SHARED_CACHE,
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -180,9 +241,93 @@ USE_TZ = True
 STATIC_URL = 'static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Images per carousel post (posts/carousel/). The multipart upload is streamed: files larger than
+# FILE_UPLOAD_MAX_MEMORY_SIZE go to temporary files instead of memory.
+CAROUSEL_MAX_IMAGES = 10
 
 AUTH_USER_MODEL = 'users.CustomUser'
 
+# Pub/sub feeding the live post stream (posts/stream/). The in-process broker only reaches clients of the same worker;
+# point this at another shared.pubsub.Broker implementation to fan out across workers.
+PUBSUB_BROKER = 'shared.pubsub.InProcessBroker'
+POST_STREAM_TICK_SECONDS = 1
+
+# Trending posts (posts/trending/), see posts/trending.py. Run `celery -A instagram_clone beat` for the schedule.
+TRENDING_HALF_LIFE_HOURS = 24
+TRENDING_RECOMPUTE_DAYS = 7
+TRENDING_SIZE = 100
+
+# Explore candidates (posts/explore/), see posts/explore.py.
+EXPLORE_WINDOW_DAYS = 90
+EXPLORE_CANDIDATES = 50
+EXPLORE_SEEDS_PER_USER = 100  # posts of each user's latest likes (and comment likes) that seed the scores
+EXPLORE_ENGAGERS_PER_POST = 500  # most recent engagers of each seed post that take part in the scores
+EXPLORE_ROWS_PER_ENGAGER = 200  # latest likes (and comment likes) of each of those engagers
+
+# Rows per statement when soft-deleted posts and comments are purged, see posts/purge.py.
+PURGE_BATCH_SIZE = 1000
+
+# Rows per transaction when a table is copied into its hash-partitioned version, see shared/operations.py.
+PARTITION_COPY_BATCH_SIZE = 10000
+
+# Celery queues, see README for the workers that consume them:
+# notifications - verification SMS and emails: short and latency-critical, never stuck behind other work.
+# default       - per-event work such as hashtag extraction.
+# bulk          - periodic and fan-out jobs that run for seconds to minutes.
+# Priorities (0-9, higher first) order messages within a queue on RabbitMQ. Every route sets one: a
+# CELERY_TASK_DEFAULT_PRIORITY would override them in apply_async(), and send_task() (the outbox relay) ignores it.
+CELERY_TASK_DEFAULT_QUEUE = 'default'
+CELERY_TASK_QUEUE_MAX_PRIORITY = 10
+CELERY_TASK_ROUTES = {
+    'users.tasks.send_phone_verification_code': {'queue': 'notifications', 'priority': 9},
+    'users.tasks.send_email_verification_code': {'queue': 'notifications', 'priority': 8},
+    'posts.tasks.extract_post_entities': {'queue': 'default', 'priority': 5},
+    # Clients wait for the dimensions of new carousel images.
+    'posts.tasks.process_*': {'queue': 'default', 'priority': 5},
+    'posts.tasks.purge_post_task': {'queue': 'bulk', 'priority': 3},
+    'posts.tasks.purge_comments_task': {'queue': 'bulk', 'priority': 3},
+    'posts.tasks.*': {'queue': 'bulk', 'priority': 5},
+    '*': {'queue': 'default', 'priority': 5},
+}
+CELERY_TASK_CREATE_MISSING_QUEUES = True
+# One message per worker process at a time, so a long task never holds short ones hostage in its prefetch buffer.
+# The notifications worker raises this on the command line.
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+# Tasks ack on receipt unless they set acks_late (the idempotent bulk jobs, which are redelivered if a worker dies).
+CELERY_TASK_REJECT_ON_WORKER_LOST = True
+
+# Per-queue task counters behind /metrics/celery/, written by the workers, see shared/task_metrics.py.
+TASK_METRICS_CACHE = 'task_metrics'
+
+# Tasks enqueued through shared/outbox.py are published by `manage.py relay_outbox`, which polls this often when idle.
+OUTBOX_BATCH_SIZE = 500
+OUTBOX_POLL_INTERVAL = 0.2
+
+CELERY_BEAT_SCHEDULE = {
+    'refresh-trending-posts': {
+        'task': 'posts.tasks.refresh_trending_posts',
+        'schedule': 60.0,
+    },
+    'recompute-post-scores': {
+        'task': 'posts.tasks.recompute_post_scores',
+        'schedule': 15 * 60.0,
+    },
+    'purge-deleted-content': {
+        'task': 'posts.tasks.purge_deleted_content',
+        'schedule': 60 * 60.0,
+    },
+    'update-explore-candidates': {
+        'task': 'posts.tasks.update_explore_candidates',
+        'schedule': 10 * 60.0,
+    },
+}
+
+# Admin changelists count exactly up to this many rows, then use estimates and keyset links, see shared/admin.py.
+ADMIN_COUNT_LIMIT = 10000
+
+# Responses smaller than this are not worth compressing, see shared/middleware.py.
+COMPRESSION_MIN_SIZE = 1024
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -19,8 +19,12 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from shared.views import DatabasePoolMetricsAPIView, TaskMetricsAPIView
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('users/', include('users.urls')),
     path('posts/', include('posts.urls')),
+    path('metrics/db-pool/', DatabasePoolMetricsAPIView.as_view()),
+    path('metrics/celery/', TaskMetricsAPIView.as_view()),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -1,27 +1,49 @@
 from django.contrib import admin
-from .models import Post, Comment, PostLike, CommentLike
+
+from shared.admin import LargeTableAdmin
+from .models import Post, PostMedia, Comment, PostLike, CommentLike
+
+
+class PostMediaInline(admin.TabularInline):
+    model = PostMedia
+    fields = ['position', 'image', 'width', 'height']
+    readonly_fields = ['width', 'height']
+    extra = 0
 
 
 @admin.register(Post)
-class PostAdmin(admin.ModelAdmin):
+class PostAdmin(LargeTableAdmin):
+    inlines = [PostMediaInline]
     list_display = ['id', 'author', 'caption', 'created_at']
-    search_fields = ['id', 'author__username', 'caption']
+    list_select_related = ['author']
+    search_fields = ['caption']
+    search_user_field = 'author'
+    search_text_field = 'caption'
 
 
 @admin.register(Comment)
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(LargeTableAdmin):
     list_display = ['id', 'author', 'created_at']
-    search_fields = ['id', 'author__username', 'comment_text']
+    list_select_related = ['author']
+    search_fields = ['comment_text']
+    search_id_fields = ['pk', 'post']
+    search_user_field = 'author'
+    search_text_field = 'comment_text'
 
 
 @admin.register(PostLike)
-class PostLikeAdmin(admin.ModelAdmin):
+class PostLikeAdmin(LargeTableAdmin):
     list_display = ['id', 'author', 'post', 'created_at']
-    search_fields = ['id', 'post__caption']
+    list_select_related = ['author', 'post__author']
+    search_fields = ['post']
+    search_id_fields = ['pk', 'post']
+    search_user_field = 'author'
 
 
 @admin.register(CommentLike)
-class CommentLikeAdmin(admin.ModelAdmin):
+class CommentLikeAdmin(LargeTableAdmin):
     list_display = ['id', 'comment', 'author']
-    search_fields = ['id', 'comment__comment_text']
-
+    list_select_related = ['author', 'comment__author']
+    search_fields = ['comment']
+    search_id_fields = ['pk', 'comment']
+    search_user_field = 'author'
@@ -0,0 +1,172 @@
+import asyncio
+import json
+import uuid
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views import View
+from rest_framework.exceptions import APIException, NotFound
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from shared.custom_pagination import CustomPagination
+from shared.pubsub import get_broker
+from shared.renderers import dumps
+from .models import Post, Comment, PostLike, AUTHOR_FIELDS
+from .serializers import PostReadSerializer, CommentReadSerializer, PostLikeReadSerializer, attach_replies
+from .signals import post_channel
+
+MAX_STREAM_POSTS = 100
+MAX_STREAM_COMMENTS_PER_TICK = 50
+STREAM_HEARTBEAT_SECONDS = 15
+
+
+def json_response(data, status=200):
+    # Same bytes as the DRF endpoints render.
+    return HttpResponse(dumps(data), content_type='application/json', status=status)
+
+
+class AsyncReadAPIView(View):
+    """
+    Base class for the read-only endpoints served natively under ASGI.
+    Authentication is optional like AllowAny/IsAuthenticatedOrReadOnly GETs, but an invalid token is still rejected.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        # DRF exceptions (an invalid token, a page out of range) get the JSON error the DRF views respond with.
+        try:
+            result = await sync_to_async(JWTAuthentication().authenticate)(request)
+            request.user = result[0] if result else AnonymousUser()
+            return await super().dispatch(request, *args, **kwargs)
+        except APIException as exc:
+            detail = exc.detail if isinstance(exc.detail, dict) else {'detail': exc.detail}
+            return json_response(detail, status=exc.status_code)
+
+
+class AsyncPostListAPIView(AsyncReadAPIView):
+    async def get(self, request):
+        # Counts, me_liked and the author are annotated onto the page query; the total count runs concurrently with it.
+        queryset = Post.objects.with_stats(request.user).order_by('-created_at')
+        paginator = CustomPagination()
+        posts = await paginator.apaginate_queryset(queryset, request)
+        serializer = PostReadSerializer(posts, many=True, context={'request': request})
+        return json_response(paginator.get_paginated_data(serializer.data))
+
+
+class AsyncPostRetrieveAPIView(AsyncReadAPIView):
+    async def get(self, request, id):
+        try:
+            post = await Post.objects.with_stats(request.user).aget(id=id)
+        except Post.DoesNotExist:
+            raise NotFound('No Post matches the given query.')  # what get_object_or_404() says in the DRF view
+
+        serializer = PostReadSerializer(post, context={'request': request})
+        return json_response(serializer.data)
+
+
+class AsyncCommentListAPIView(AsyncReadAPIView):
+    async def get(self, request, id):
+        queryset = Comment.objects.with_stats(request.user).filter(post_id=id, post__deleted_at=None).order_by('created_at')
+        comments = attach_replies([comment async for comment in queryset])
+        serializer = CommentReadSerializer(comments, many=True, context={'request': request})
+        return json_response(serializer.data)
+
+
+class AsyncPostLikeListAPIView(AsyncReadAPIView):
+    async def get(self, request, id):
+        queryset = PostLike.objects.filter(post_id=id, post__deleted_at=None).select_related('author').only('id', 'post', *AUTHOR_FIELDS).order_by('created_at')
+        post_likes = [post_like async for post_like in queryset]
+        serializer = PostLikeReadSerializer(post_likes, many=True, context={'request': request})
+        return json_response(serializer.data)
+
+
+class PostEventStreamView(AsyncReadAPIView):
+    """
+    Server-sent events for /posts/stream/?ids=<uuid>,<uuid>.
+    Sends a `snapshot` with the current counts, then at most one `counts` (deltas) and one `comments` event per tick,
+    however many likes and comments arrived during it. A `deleted` event lists the posts deleted during the tick.
+    A `resync` event asks the client to refetch the counts.
+    """
+
+    async def get(self, request):
+        try:
+            post_ids = {uuid.UUID(value) for value in request.GET.get('ids', '').split(',') if value}
+        except ValueError:
+            return JsonResponse({'detail': 'ids must be comma separated post ids.'}, status=400)
+        if not post_ids or len(post_ids) > MAX_STREAM_POSTS:
+            return JsonResponse({'detail': f'Provide between 1 and {MAX_STREAM_POSTS} post ids.'}, status=400)
+
+        response = StreamingHttpResponse(self.stream(post_ids), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    @staticmethod
+    def event(name, data):
+        return f'event: {name}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n'
+
+    async def stream(self, post_ids):
+        tick = getattr(settings, 'POST_STREAM_TICK_SECONDS', 1)
+        # Subscribe before reading the snapshot, so nothing committed in between is missed.
+        subscription = get_broker().subscribe(post_channel(post_id) for post_id in post_ids)
+        try:
+            snapshot = await self.snapshot(post_ids)
+            # The response outlives the request and request_finished only fires when the client disconnects, so the
+            # connections (from the pool, possibly its only one) go back now. close_all() looks them up in the
+            # thread sync_to_async() runs it in, the one the queries ran in.
+            await sync_to_async(connections.close_all)()
+            yield self.event('snapshot', snapshot)
+            while True:
+                try:
+                    first = await subscription.get(timeout=STREAM_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ': keep-alive\n\n'
+                    continue
+
+                await asyncio.sleep(tick)  # let the rest of the tick's events pile up
+                messages = [first] + subscription.get_nowait_all()
+                if subscription.overflowed:
+                    subscription.overflowed = False
+                    yield self.event('resync', {})
+                    continue
+
+                for name, data in self.coalesce(messages):
+                    yield self.event(name, data)
+        finally:
+            subscription.close()
+
+    @staticmethod
+    async def snapshot(post_ids):
+        queryset = Post.objects.with_stats().filter(id__in=post_ids).values('id', 'likes_count', 'comments_count')
+        return {
+            str(row['id']): {'likes': row['likes_count'], 'comments': row['comments_count']}
+            async for row in queryset
+        }
+
+    @staticmethod
+    def coalesce(messages):
+        deltas = defaultdict(lambda: {'likes': 0, 'comments': 0})
+        comments = []
+        deleted = []
+        for channel, message in messages:
+            post_id = channel.split(':', 1)[1]
+            if message['type'] == 'post_deleted':
+                deleted.append(post_id)
+            elif message['type'] == 'like':
+                deltas[post_id]['likes'] += message['delta']
+            elif message['type'] == 'comment':
+                deltas[post_id]['comments'] += message['delta']
+                if 'comment' in message and len(comments) < MAX_STREAM_COMMENTS_PER_TICK:
+                    comments.append({'post_id': post_id, **message['comment']})
+
+        changed = {post_id: delta for post_id, delta in deltas.items() if delta['likes'] or delta['comments']}
+        if changed:
+            yield 'counts', changed
+        if comments:
+            yield 'comments', comments
+        if deleted:
+            yield 'deleted', deleted
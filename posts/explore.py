@@ -0,0 +1,169 @@
+"""
+Explore candidates from item-item co-engagement.
+
+Users who liked a post or one of its comments since the last run get their candidates rebuilt. For a batch of such
+users the job loads their engagement, takes the posts of each user's latest EXPLORE_SEEDS_PER_USER likes as seeds,
+loads the latest EXPLORE_ENGAGERS_PER_POST engagers of each seed and the latest EXPLORE_ROWS_PER_ENGAGER likes of each
+of those users (all within EXPLORE_WINDOW_DAYS), builds the sparse user x post matrix A, and scores posts with
+cosine-normalised co-engagement: scores = H . (A_seed^T A) / sqrt(n_seed n_post), H being the batch's own rows. The
+caps bound the work per heavy liker and per viral post, whose co-engagement is estimated from recent activity.
+"""
+import uuid
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+from scipy import sparse
+
+from .models import Post, PostLike, CommentLike, ExploreCandidates, JobWatermark
+
+WATERMARK_NAME = 'explore'
+WATERMARK_OVERLAP = timedelta(minutes=5)  # likes committed late with an older created_at are still picked up
+POST_LIKE_WEIGHT = 1.0
+COMMENT_LIKE_WEIGHT = 0.5
+BATCH_SIZE = 200
+IN_CHUNK_SIZE = 1000  # ids per IN list; larger sets are queried in chunks
+
+
+def chunked(ids):
+    ids = list(ids)
+    for start in range(0, len(ids), IN_CHUNK_SIZE):
+        yield ids[start:start + IN_CHUNK_SIZE]
+
+
+def latest(likes, partition_field, count):
+    # The latest `count` likes of each partition, ranked in SQL.
+    return likes.annotate(
+        recency=Window(RowNumber(), partition_by=F(partition_field), order_by=F('created_at').desc()),
+    ).filter(recency__lte=count)
+
+
+def engagements(since, users, per_user=None):
+    # With per_user, only the latest `per_user` post likes and `per_user` comment likes of each user.
+    rows = []
+    for chunk in chunked(users):
+        post_likes = PostLike.objects.filter(created_at__gte=since, author_id__in=chunk).order_by()
+        comment_likes = CommentLike.objects.filter(created_at__gte=since, author_id__in=chunk).order_by()
+        if per_user is not None:
+            post_likes = latest(post_likes, 'author_id', per_user)
+            comment_likes = latest(comment_likes, 'author_id', per_user)
+        rows += [(user_id, post_id, POST_LIKE_WEIGHT)
+                 for user_id, post_id in post_likes.values_list('author_id', 'post_id')]
+        rows += [(user_id, post_id, COMMENT_LIKE_WEIGHT)
+                 for user_id, post_id in comment_likes.values_list('author_id', 'comment__post_id')]
+    return rows
+
+
+def recent_engagers(since, posts, per_post):
+    # The authors of the latest `per_post` likes of each post and of the latest `per_post` likes on its comments,
+    # so a viral post costs no more than any other.
+    engagers = set()
+    for chunk in chunked(posts):
+        for likes, post_field in ((PostLike.objects, 'post_id'), (CommentLike.objects, 'comment__post_id')):
+            recent = latest(likes.filter(created_at__gte=since, **{f'{post_field}__in': chunk}), post_field, per_post)
+            engagers.update(recent.values_list('author_id', flat=True))
+    return engagers
+
+
+def engagement_matrix(rows, user_index, post_index):
+    matrix = sparse.coo_matrix(
+        (
+            np.array([weight for _, _, weight in rows], dtype=np.float32),
+            (
+                np.array([user_index[user_id] for user_id, _, _ in rows], dtype=np.int32),
+                np.array([post_index[post_id] for _, post_id, _ in rows], dtype=np.int32),
+            ),
+        ),
+        shape=(len(user_index), len(post_index)),
+    ).tocsr()  # duplicates are summed here
+    np.minimum(matrix.data, 1.0, out=matrix.data)
+    return matrix
+
+
+def top_columns(row_data, row_indices, count):
+    if len(row_data) > count:
+        part = np.argpartition(-row_data, count)[:count]
+    else:
+        part = np.arange(len(row_data))
+    return row_indices[part[np.argsort(-row_data[part], kind='stable')]]
+
+
+def update_candidates():
+    now = timezone.now()
+    window_start = now - timedelta(days=getattr(settings, 'EXPLORE_WINDOW_DAYS', 90))
+    watermark, _ = JobWatermark.objects.get_or_create(name=WATERMARK_NAME, defaults={'position': window_start})
+    since = watermark.position - WATERMARK_OVERLAP
+
+    users = set(PostLike.objects.filter(created_at__gte=since).values_list('author_id', flat=True).distinct())
+    users |= set(CommentLike.objects.filter(created_at__gte=since).values_list('author_id', flat=True).distinct())
+    users = sorted(users)
+    for start in range(0, len(users), BATCH_SIZE):
+        update_batch(users[start:start + BATCH_SIZE], window_start)
+
+    watermark.position = now
+    watermark.save(update_fields=['position'])
+    return len(users)
+
+
+def update_batch(user_ids, window_start):
+    size = getattr(settings, 'EXPLORE_CANDIDATES', 50)
+    # The batch's whole history is loaded: it is what the scores drop as already seen.
+    own = engagements(window_start, user_ids)
+    if not own:  # every like of the batch is older than the window
+        save_candidates({user_id: [] for user_id in user_ids}, size)
+        return
+
+    seeds_per_user = getattr(settings, 'EXPLORE_SEEDS_PER_USER', 100)
+    seed_posts = {post_id for _, post_id, _ in engagements(window_start, user_ids, per_user=seeds_per_user)}
+    per_post = getattr(settings, 'EXPLORE_ENGAGERS_PER_POST', 500)
+    engagers = recent_engagers(window_start, seed_posts, per_post) - set(user_ids)
+    rows = own + engagements(window_start, engagers, per_user=getattr(settings, 'EXPLORE_ROWS_PER_ENGAGER', 200))
+
+    user_index = {user_id: i for i, user_id in enumerate(set(user_ids) | engagers)}
+    post_ids = list({post_id for _, post_id, _ in rows} | seed_posts)
+    post_index = {post_id: j for j, post_id in enumerate(post_ids)}
+    matrix = engagement_matrix(rows, user_index, post_index)
+
+    seed_columns = np.array([post_index[post_id] for post_id in seed_posts], dtype=np.int32)
+    batch_rows = np.array([user_index[user_id] for user_id in user_ids], dtype=np.int32)
+
+    with np.errstate(divide='ignore'):
+        inverse_norm = np.nan_to_num(1.0 / np.sqrt(np.asarray(matrix.sum(axis=0)).ravel()), posinf=0.0)
+    seeds = matrix[:, seed_columns]
+    similarity = sparse.diags(inverse_norm[seed_columns]) @ (seeds.T @ matrix) @ sparse.diags(inverse_norm)
+
+    history = matrix[batch_rows]
+    scores = (history[:, seed_columns] @ similarity).tocsr()
+    seen = history.copy()
+    seen.data[:] = 1
+    scores = (scores - scores.multiply(seen)).tocsr()  # drop posts the user already engaged with
+    scores.eliminate_zeros()
+
+    # Over-fetch so the user's own posts can be dropped without running short.
+    ranked = {}
+    for i, user_id in enumerate(user_ids):
+        start, end = scores.indptr[i], scores.indptr[i + 1]
+        ranked[user_id] = [post_ids[j] for j in top_columns(scores.data[start:end], scores.indices[start:end], size * 2)]
+    save_candidates(ranked, size)
+
+
+def save_candidates(ranked, size):
+    authors = dict(Post.objects.filter(id__in={post_id for posts in ranked.values() for post_id in posts})
+                   .values_list('id', 'author_id'))
+    ExploreCandidates.objects.bulk_create(
+        [
+            ExploreCandidates(user_id=user_id, post_ids=[
+                post_id.hex for post_id in posts if post_id in authors and authors[post_id] != user_id
+            ][:size])
+            for user_id, posts in ranked.items()
+        ],
+        update_conflicts=True, unique_fields=['user'], update_fields=['post_ids', 'updated_at'],
+    )
+
+
+def candidate_post_ids(user):
+    post_ids = ExploreCandidates.objects.filter(user=user).values_list('post_ids', flat=True)
+    return [uuid.UUID(post_id) for post_id in next(iter(post_ids), [])]
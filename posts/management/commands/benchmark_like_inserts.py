@@ -0,0 +1,88 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+LAYOUTS = {
+    'plain with author index': (False, True),
+    'plain': (False, False),
+    'partitioned': (True, False),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Measures like insert throughput into scratch tables shaped like posts_postlike: unpartitioned with and '
+        'without the single-column author index, and hash-partitioned by post (migration 0009). The tables are '
+        'logged like the real one and dropped afterwards. PostgreSQL only.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000)
+        parser.add_argument('--batch-size', type=int, default=10_000, help='Rows inserted per transaction.')
+        parser.add_argument('--posts', type=int, default=20_000, help='Distinct posts the likes are spread over.')
+        parser.add_argument('--partitions', type=int, default=16)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('The partitioned layout only exists on PostgreSQL.')
+
+        with connection.cursor() as cursor:
+            cursor.execute('CREATE TEMPORARY TABLE bench_posts AS SELECT gen_random_uuid() AS id '
+                           'FROM generate_series(1, %s)', [options['posts']])
+            try:
+                for name, (partitioned, author_index) in LAYOUTS.items():
+                    self.create_table(cursor, partitioned, author_index, options['partitions'])
+                    try:
+                        rate = self.insert(cursor, options['rows'], options['batch_size'])
+                        planning = self.per_post_planning(cursor)
+                    finally:
+                        cursor.execute('DROP TABLE bench_likes')
+                    self.stdout.write(f'{name}: {rate:,.0f} rows/s, per-post lookup planned in {planning:.3f} ms')
+            finally:
+                cursor.execute('DROP TABLE bench_posts')
+
+    @staticmethod
+    def create_table(cursor, partitioned, author_index, partitions):
+        if partitioned:
+            cursor.execute(
+                'CREATE TABLE bench_likes (id uuid NOT NULL, created_at timestamptz NOT NULL, '
+                'updated_at timestamptz NOT NULL, author_id uuid NOT NULL, post_id uuid NOT NULL, '
+                'PRIMARY KEY (id, post_id)) PARTITION BY HASH (post_id)'
+            )
+            for remainder in range(partitions):
+                cursor.execute(f'CREATE TABLE bench_likes_p{remainder} PARTITION OF bench_likes '
+                               f'FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder})')
+        else:
+            cursor.execute(
+                'CREATE TABLE bench_likes (id uuid PRIMARY KEY, created_at timestamptz NOT NULL, '
+                'updated_at timestamptz NOT NULL, author_id uuid NOT NULL, post_id uuid NOT NULL)'
+            )
+            if author_index:
+                cursor.execute('CREATE INDEX ON bench_likes (author_id)')
+        # The (author, post) unique constraint and the (post, created_at) index every layout keeps.
+        cursor.execute('CREATE UNIQUE INDEX ON bench_likes (author_id, post_id)')
+        cursor.execute('CREATE INDEX ON bench_likes (post_id, created_at)')
+
+    @staticmethod
+    def insert(cursor, rows, batch_size):
+        elapsed = 0.0
+        for _ in range(0, rows, batch_size):
+            start = time.perf_counter()
+            with transaction.atomic():
+                cursor.execute(
+                    'INSERT INTO bench_likes SELECT gen_random_uuid(), now(), now(), gen_random_uuid(), post.id '
+                    'FROM (SELECT id FROM bench_posts ORDER BY random() LIMIT %s) post', [batch_size]
+                )
+            elapsed += time.perf_counter() - start
+        return rows / elapsed
+
+    @staticmethod
+    def per_post_planning(cursor):
+        cursor.execute('ANALYZE bench_likes')
+        cursor.execute('SELECT id FROM bench_posts LIMIT 1')
+        post_id = cursor.fetchone()[0]
+        cursor.execute('EXPLAIN (ANALYZE, FORMAT JSON) SELECT * FROM bench_likes WHERE post_id = %s '
+                       'ORDER BY created_at', [post_id])
+        plan = cursor.fetchone()[0]
+        return plan[0]['Planning Time']
@@ -0,0 +1,49 @@
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Measures the memory a feed page takes to load with the author narrowed to AUTHOR_FIELDS (with_stats()) '
+        'against every column of the post and its author: the peak Python allocation while the rows are fetched '
+        '(tracemalloc) and, on PostgreSQL, the size of the rows the database sends. Run it on seeded data.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100, help='Posts on the page.')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per variant; the lowest peak is reported.')
+
+    def handle(self, *args, **options):
+        if not Post.objects.exists():
+            raise CommandError('There are no posts: run seed_data first.')
+
+        variants = {
+            'every column': Post.objects.with_stats().defer(None).defer('search_vector'),
+            'AUTHOR_FIELDS': Post.objects.with_stats(),
+        }
+        for name, queryset in variants.items():
+            page = queryset.order_by('-created_at')[:options['rows']]
+            list(page.all())  # warm-up: imports, compiled query caches
+            peaks = []
+            for _ in range(options['repeat']):
+                tracemalloc.start()
+                try:
+                    list(page.all())
+                    peaks.append(tracemalloc.get_traced_memory()[1])
+                finally:
+                    tracemalloc.stop()
+            line = f'{name}: peak {min(peaks) / 1024:,.0f} KiB'
+            if connection.vendor == 'postgresql':
+                line += f', rows {self.result_size(page):,} bytes'
+            self.stdout.write(line)
+
+    @staticmethod
+    def result_size(queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT sum(octet_length(page::text)) FROM ({sql}) page', params)
+            return cursor.fetchone()[0]
@@ -0,0 +1,68 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPConnection, HTTPSConnection
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        'Load-tests the post read endpoints of a running server: the DRF views against their async variants '
+        '(/posts/async/), each client thread holding one keep-alive connection. Run it against the project served '
+        'under WSGI (e.g. gunicorn instagram_clone.wsgi) and under ASGI (e.g. uvicorn '
+        'instagram_clone.asgi:application) to compare them at the same concurrency.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000')
+        parser.add_argument('--concurrency', type=int, default=100, help='Concurrent connections.')
+        parser.add_argument('--requests', type=int, default=5000, help='Requests per path.')
+        parser.add_argument('--path', action='append', dest='paths',
+                            help='Path to load, repeatable. Defaults to /posts/ and /posts/async/.')
+        parser.add_argument('--token', help='Access token, to measure the queries of a signed-in viewer.')
+
+    def handle(self, *args, **options):
+        url = urlsplit(options['url'])
+        if url.scheme not in ('http', 'https'):
+            raise CommandError('--url must be an http(s) URL.')
+        headers = {'Authorization': f'Bearer {options["token"]}'} if options['token'] else {}
+        for path in options['paths'] or ['/posts/', '/posts/async/']:
+            self.load(url, path, headers, options['concurrency'], options['concurrency'])  # warm-up
+            latencies, errors, elapsed = self.load(url, path, headers, options['requests'], options['concurrency'])
+            latencies.sort()
+            self.stdout.write(
+                f'{path}: {len(latencies) / elapsed:,.0f} req/s, '
+                f'p50 {latencies[len(latencies) // 2] * 1000:.1f} ms, '
+                f'p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f} ms, {errors} errors'
+            )
+
+    def load(self, url, path, headers, requests, concurrency):
+        per_client = [requests // concurrency + (i < requests % concurrency) for i in range(concurrency)]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as executor:
+            results = list(executor.map(lambda count: self.client(url, path, headers, count), per_client))
+        elapsed = time.perf_counter() - start
+        return [latency for latencies, _ in results for latency in latencies], sum(e for _, e in results), elapsed
+
+    @staticmethod
+    def client(url, path, headers, count):
+        connection_class = HTTPSConnection if url.scheme == 'https' else HTTPConnection
+        connection = connection_class(url.hostname, url.port, timeout=60)
+        latencies, errors = [], 0
+        try:
+            for _ in range(count):
+                start = time.perf_counter()
+                try:
+                    connection.request('GET', path, headers=headers)
+                    response = connection.getresponse()
+                    response.read()
+                except OSError:
+                    connection.close()  # reconnects on the next request
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - start)
+                errors += response.status != 200
+        finally:
+            connection.close()
+        return latencies, errors
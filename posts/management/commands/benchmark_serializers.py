@@ -0,0 +1,55 @@
+from timeit import repeat
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.test import RequestFactory
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from posts import serializers
+from posts.models import Post, Comment, PostLike, AUTHOR_FIELDS
+from shared.renderers import dumps
+from users.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = (
+        'Times serializing and rendering read responses with the DRF serializers and JSONRenderer against the '
+        'compiled serializers and orjson (what the GET endpoints use): a feed page, the comment thread and the likes '
+        'of the most commented and most liked posts. Run it on seeded data.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=200, help='Posts on the feed page.')
+        parser.add_argument('--number', type=int, default=5, help='Renders per timing; the best of 5 is reported.')
+
+    def handle(self, *args, **options):
+        viewer = CustomUser.objects.first()
+        if viewer is None or not Post.objects.exists():
+            raise CommandError('There are no posts: run seed_data first.')
+        request = Request(RequestFactory().get('/'))
+        request.user = viewer
+        context = {'request': request}
+
+        commented = Post.objects.annotate(count=Count('comments')).order_by('-count').first()
+        liked = Post.objects.annotate(count=Count('likes')).order_by('-count').first()
+        comments = Comment.objects.with_stats(viewer).filter(post=commented).order_by('created_at')
+        cases = [
+            ('feed page', serializers.PostSerializer, serializers.PostReadSerializer,
+             list(Post.objects.with_stats(viewer).order_by('-created_at')[:options['posts']])),
+            ('comment thread', serializers.CommentSerializer, serializers.CommentReadSerializer,
+             serializers.attach_replies(list(comments))),
+            ('post likes', serializers.PostLikeSerializer, serializers.PostLikeReadSerializer,
+             list(PostLike.objects.filter(post=liked).select_related('author').only('id', 'post', *AUTHOR_FIELDS))),
+        ]
+        for name, drf_serializer, compiled_serializer, rows in cases:
+            drf = self.best(lambda: JSONRenderer().render(drf_serializer(rows, many=True, context=context).data),
+                            options['number'])
+            compiled = self.best(lambda: dumps(compiled_serializer(rows, many=True, context=context).data),
+                                 options['number'])
+            self.stdout.write(f'{name} ({len(rows)} rows): DRF {drf * 1000:.2f} ms, compiled {compiled * 1000:.2f} ms, '
+                              f'{drf / compiled:.1f}x')
+
+    @staticmethod
+    def best(function, number):
+        return min(repeat(function, number=number, repeat=5)) / number
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.tasks import extract_post_entities
+
+
+class Command(BaseCommand):
+    help = 'Extracts hashtags and mentions of existing posts, e.g. after deploying the hashtag tables.'
+
+    def handle(self, *args, **options):
+        count = 0
+        for post_id in Post.objects.values_list('id', flat=True).iterator(chunk_size=2000):
+            extract_post_entities(post_id)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f'Extracted entities of {count} posts.'))
@@ -0,0 +1,251 @@
+import io
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.postgres.search import SearchVector
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from posts.models import Post, Comment, PostLike, CommentLike
+from shared.models import uuid7
+from shared.search import SEARCH_CONFIG
+from users.models import CustomUser, UserStats
+
+
+class Loader:
+    """
+    Buffers unsaved model instances and writes them in one round trip.
+    On PostgreSQL rows are streamed with COPY, everywhere else bulk_create is used.
+    Instances are never passed through Model.save(), so CustomUser.clean() is skipped.
+    """
+
+    def __init__(self, model, use_copy):
+        self.model = model
+        self.use_copy = use_copy
+        self.buffer = []
+        self.total = 0
+
+    def add(self, obj):
+        self.buffer.append(obj)
+
+    def flush(self):
+        if not self.buffer:
+            return
+        if self.use_copy:
+            self._copy(self.buffer)
+        else:
+            self.model.objects.bulk_create(self.buffer, batch_size=5000)
+        self.total += len(self.buffer)
+        self.buffer = []
+
+    def _copy(self, objs):
+        fields = self.model._meta.concrete_fields
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        columns = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+
+        stream = io.StringIO()
+        for obj in objs:
+            values = (field.get_db_prep_save(field.pre_save(obj, True), connection) for field in fields)
+            stream.write('\t'.join(self._copy_value(value) for value in values))
+            stream.write('\n')
+        stream.seek(0)
+
+        sql = f'COPY {table} ({columns}) FROM STDIN'
+        with connection.cursor() as cursor:
+            if hasattr(cursor, 'copy_expert'):  # psycopg2
+                cursor.copy_expert(sql, stream)
+            else:  # psycopg3
+                with cursor.copy(sql) as copy:
+                    copy.write(stream.getvalue())
+
+    @staticmethod
+    def _copy_value(value):
+        if value is None:
+            return '\\N'
+        return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+                .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    # auto_now/auto_now_add would stamp every seeded row with the current time.
+    fields = [field for model in models for field in model._meta.concrete_fields
+              if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Command(BaseCommand):
+    help = 'Generates synthetic users, posts, comments and likes with a skewed (Zipfian) distribution.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--max-post-likes', type=int, default=5000,
+                            help='Likes of the most popular post; rank r gets max / r^s.')
+        parser.add_argument('--max-comments', type=int, default=300,
+                            help='Comments of the most popular post; rank r gets max / r^s.')
+        parser.add_argument('--max-comment-likes', type=int, default=200)
+        parser.add_argument('--zipf-exponent', type=float, default=1.1)
+        parser.add_argument('--reply-ratio', type=float, default=0.6,
+                            help='Probability that a comment is a reply rather than a top-level comment.')
+        parser.add_argument('--days', type=int, default=90, help='Time window the content is spread over.')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Posts written per transaction.')
+        parser.add_argument('--password', default='seed-password')
+        parser.add_argument('--method', choices=['auto', 'copy', 'bulk'], default='auto')
+        parser.add_argument('--seed', type=int, default=None)
+
+    def handle(self, *args, **options):
+        use_copy = options['method'] == 'copy' or (options['method'] == 'auto' and connection.vendor == 'postgresql')
+        if use_copy and connection.vendor != 'postgresql':
+            raise CommandError('COPY is only available on PostgreSQL.')
+        if options['users'] < 1:
+            raise CommandError('At least one user is required.')
+
+        self.rng = random.Random(options['seed'])
+        self.options = options
+        self.now = timezone.now()
+        self.loaders = {model: Loader(model, use_copy) for model in (CustomUser, Post, Comment, PostLike, CommentLike)}
+
+        with explicit_timestamps(*self.loaders):
+            self.user_ids = self.create_users()
+            # Popular authors post more often: author at rank r is weighted 1 / r^s.
+            self.author_weights = list(accumulate(
+                1 / rank ** options['zipf_exponent'] for rank in range(1, len(self.user_ids) + 1)
+            ))
+            self.create_posts()
+
+        if connection.vendor == 'postgresql':
+            # Rows loaded here skip SearchVectorMixin.save(), so build their search vectors in one pass.
+            Post.objects.filter(search_vector=None).update(search_vector=SearchVector('caption', config=SEARCH_CONFIG))
+            Comment.objects.filter(search_vector=None).update(search_vector=SearchVector('comment_text', config=SEARCH_CONFIG))
+
+        # The loaders bypass the signals that maintain the profile counters.
+        UserStats.rebuild()
+
+        for model, loader in self.loaders.items():
+            self.stdout.write(f'{model.__name__}: {loader.total} rows')
+        self.stdout.write(self.style.SUCCESS(f'Seeded using {"COPY" if use_copy else "bulk_create"}.'))
+
+    def zipf(self, maximum, population):
+        # Rank-frequency Zipf law: the item at rank r gets maximum / r^s.
+        rank = self.rng.randint(1, population)
+        return int(maximum / rank ** self.options['zipf_exponent'])
+
+    def random_time(self, start):
+        span = (self.now - start).total_seconds()
+        return start + timedelta(seconds=self.rng.random() * span)
+
+    def flush(self):
+        with transaction.atomic():
+            for loader in self.loaders.values():
+                loader.flush()
+
+    def create_users(self):
+        # Hashing once and reusing the hash keeps the seeder from spending its time in PBKDF2.
+        password = make_password(self.options['password'])
+        start = self.now - timedelta(days=self.options['days'])
+        loader = self.loaders[CustomUser]
+        user_ids = []
+
+        for i in range(self.options['users']):
+            created_at = self.random_time(start)
+            user_id = uuid7(created_at)
+            username = f'seed-{user_id.hex[-12:]}'  # the leading digits of a UUIDv7 are its timestamp
+            loader.add(CustomUser(
+                id=user_id,
+                username=username,
+                email=f'{username}@example.com',
+                password=password,
+                auth_type=CustomUser.AuthTypes.VIA_EMAIL,
+                auth_status=CustomUser.AuthStatus.DONE,
+                date_joined=created_at,
+                created_at=created_at,
+                updated_at=created_at,
+            ))
+            user_ids.append(user_id)
+            if len(loader.buffer) >= self.options['batch_size']:
+                self.flush()
+
+        self.flush()
+        return user_ids
+
+    def create_posts(self):
+        options = self.options
+        start = self.now - timedelta(days=options['days'])
+
+        for i in range(options['posts']):
+            author_id = self.rng.choices(self.user_ids, cum_weights=self.author_weights)[0]
+            created_at = self.random_time(start)
+            post = Post(
+                id=uuid7(created_at),
+                author_id=author_id,
+                image=f'post_images/seed-{i % 100}.jpg',
+                caption=f'Seeded post #{i}',
+                created_at=created_at,
+                updated_at=created_at,
+            )
+            self.loaders[Post].add(post)
+            self.create_post_likes(post)
+            self.create_comments(post)
+
+            if (i + 1) % options['batch_size'] == 0:
+                self.flush()
+                self.stdout.write(f'{i + 1} posts written')
+
+        self.flush()
+
+    def sample_users(self, count):
+        return self.rng.sample(self.user_ids, min(count, len(self.user_ids)))
+
+    def create_post_likes(self, post):
+        count = self.zipf(self.options['max_post_likes'], self.options['posts'])
+        for author_id in self.sample_users(count):
+            created_at = self.random_time(post.created_at)
+            self.loaders[PostLike].add(PostLike(
+                id=uuid7(created_at), author_id=author_id, post_id=post.id,
+                created_at=created_at, updated_at=created_at,
+            ))
+
+    def create_comments(self, post):
+        count = self.zipf(self.options['max_comments'], self.options['posts'])
+        comments = []
+        created_at = post.created_at
+
+        for _ in range(count):
+            parent = None
+            if comments and self.rng.random() < self.options['reply_ratio']:
+                # Replying to the latest comment most of the time produces deep threads.
+                parent = comments[-1] if self.rng.random() < 0.7 else self.rng.choice(comments)
+            created_at = self.random_time(created_at)
+            comment = Comment(
+                id=uuid7(created_at),
+                author_id=self.rng.choice(self.user_ids),
+                post_id=post.id,
+                parent_id=parent.id if parent else None,
+                comment_text=f'Seeded comment #{len(comments)}',
+                created_at=created_at,
+                updated_at=created_at,
+            )
+            comments.append(comment)
+            self.loaders[Comment].add(comment)
+            self.create_comment_likes(comment)
+
+    def create_comment_likes(self, comment):
+        count = self.zipf(self.options['max_comment_likes'], self.options['posts'])
+        for author_id in self.sample_users(count):
+            created_at = self.random_time(comment.created_at)
+            self.loaders[CommentLike].add(CommentLike(
+                id=uuid7(created_at), author_id=author_id, comment_id=comment.id,
+                created_at=created_at, updated_at=created_at,
+            ))
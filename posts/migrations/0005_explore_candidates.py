@@ -0,0 +1,31 @@
+# Generated by Django 5.1.4 on 2026-10-19 12:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0004_post_scores_trending'),
+        ('users', '0006_username_trigram_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExploreCandidates',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='explore_candidates', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('post_ids', models.JSONField(default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='JobWatermark',
+            fields=[
+                ('name', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('position', models.DateTimeField()),
+            ],
+        ),
+    ]
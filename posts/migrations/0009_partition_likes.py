@@ -0,0 +1,33 @@
+# Generated by Django 5.1.4 on 2026-10-19 12:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+from shared.operations import HashPartition
+
+
+class Migration(migrations.Migration):
+    # HashPartition copies the likes in batches that commit one by one, while the tables stay writable.
+    atomic = False
+
+    dependencies = [
+        ('posts', '0008_soft_delete'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='commentlike',
+            name='author',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='postlike',
+            name='author',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        # The author indexes are dropped above, before the rebuild copies the tables.
+        HashPartition('postlike', 'post', partitions=16),
+        HashPartition('commentlike', 'comment', partitions=16),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.1.4 on 2026-10-19 12:38
+
+import shared.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0009_partition_likes'),
+    ]
+
+    # Only the Python-side default changes, so the database is left alone (SQLite would otherwise rebuild
+    # every table). Existing version-4 ids stay valid.
+    operations = [
+        migrations.SeparateDatabaseAndState(state_operations=[
+            migrations.AlterField(
+                model_name='comment',
+                name='id',
+                field=models.UUIDField(default=shared.models.uuid7, editable=False, primary_key=True, serialize=False, unique=True),
+            ),
+            migrations.AlterField(
+                model_name='commentlike',
+                name='id',
+                field=models.UUIDField(default=shared.models.uuid7, editable=False, primary_key=True, serialize=False, unique=True),
+            ),
+            migrations.AlterField(
+                model_name='hashtag',
+                name='id',
+                field=models.UUIDField(default=shared.models.uuid7, editable=False, primary_key=True, serialize=False, unique=True),
+            ),
+            migrations.AlterField(
+                model_name='mention',
+                name='id',
+                field=models.UUIDField(default=shared.models.uuid7, editable=False, primary_key=True, serialize=False, unique=True),
+            ),
+            migrations.AlterField(
+                model_name='post',
+                name='id',
+                field=models.UUIDField(default=shared.models.uuid7, editable=False, primary_key=True, serialize=False, unique=True),
+            ),
+            migrations.AlterField(
+                model_name='posthashtag',
+                name='id',
+                field=models.UUIDField(default=shared.models.uuid7, editable=False, primary_key=True, serialize=False, unique=True),
+            ),
+            migrations.AlterField(
+                model_name='postlike',
+                name='id',
+                field=models.UUIDField(default=shared.models.uuid7, editable=False, primary_key=True, serialize=False, unique=True),
+            ),
+        ]),
+    ]
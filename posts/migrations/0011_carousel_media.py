@@ -0,0 +1,34 @@
+# Generated by Django 5.1.4 on 2026-10-19 12:48
+
+import django.core.validators
+import django.db.models.deletion
+import shared.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_uuid7_primary_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostMedia',
+            fields=[
+                ('id', models.UUIDField(default=shared.models.uuid7, editable=False, primary_key=True, serialize=False, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('image', models.ImageField(upload_to='post_images', validators=[django.core.validators.FileExtensionValidator(allowed_extensions=['jpg', 'jpeg', 'png', 'tiff', 'heic', 'heif'])])),
+                ('position', models.PositiveSmallIntegerField()),
+                ('width', models.PositiveIntegerField(blank=True, editable=False, null=True)),
+                ('height', models.PositiveIntegerField(blank=True, editable=False, null=True)),
+                ('post', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='media', to='posts.post')),
+            ],
+            options={
+                'verbose_name_plural': 'post media',
+                'ordering': ['position'],
+                'constraints': [models.UniqueConstraint(fields=('post', 'position'), name='post_media_position')],
+            },
+        ),
+    ]
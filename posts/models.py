@@ -1,31 +1,123 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import FileExtensionValidator, MaxLengthValidator
 from django.db import models
-from shared.models import BaseModel
+from shared.models import BaseModel, SoftDeleteManager
+from shared.search import SearchVectorMixin
 from django.contrib.auth import get_user_model
 from users.models import CustomUser
 from django.db.models.constraints import UniqueConstraint
+from django.db.models import Count, Exists, OuterRef, Prefetch, Subquery, Value
+from django.db.models.functions import Coalesce
 
 User = get_user_model()  # Second way to get User
 
-class Post(BaseModel):
-    author = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='posts')
+# The author columns posts.serializers.UserSerializer reads; loading full users would drag password hashes,
+# emails and the rest of AbstractUser through every page.
+AUTHOR_FIELDS = ('author__id', 'author__username', 'author__photo')
+
+
+def count_subquery(queryset, field):
+    # A correlated COUNT per row; unlike Count() over joins it does not multiply rows when combined.
+    counts = queryset.filter(**{field: OuterRef('pk')}).order_by().values(field).annotate(count=Count('*')).values('count')
+    return Coalesce(Subquery(counts), 0)
+
+
+class PostQuerySet(models.QuerySet):
+    def with_stats(self, user=None):
+        # Everything PostSerializer needs, fetched in the same query as the posts.
+        if user is not None and user.is_authenticated:
+            viewer_liked = Exists(PostLike.objects.filter(post=OuterRef('pk'), author=user))
+        else:
+            viewer_liked = Value(False)
+
+        return self.select_related('author').only(
+            'id', 'created_at', 'updated_at', 'image', 'caption', *AUTHOR_FIELDS,
+        ).prefetch_related(
+            # One more query per page, for all carousels on it.
+            Prefetch('media', PostMedia.objects.only('id', 'post', 'image', 'position', 'width', 'height')),
+        ).annotate(
+            likes_count=count_subquery(PostLike.objects.all(), 'post'),
+            comments_count=count_subquery(Comment.objects.all(), 'post'),
+            viewer_liked=viewer_liked,
+        )
+
+
+class CommentQuerySet(models.QuerySet):
+    def with_stats(self, user=None):
+        if user is not None and user.is_authenticated:
+            viewer_liked = Exists(CommentLike.objects.filter(comment=OuterRef('pk'), author=user))
+        else:
+            viewer_liked = Value(False)
+
+        return self.select_related('author').only(
+            'id', 'created_at', 'updated_at', 'post', 'parent', 'comment_text', *AUTHOR_FIELDS,
+        ).annotate(
+            likes_count=count_subquery(CommentLike.objects.all(), 'comment'),
+            viewer_liked=viewer_liked,
+        )
+
+
+class Post(SearchVectorMixin, BaseModel):
+    author = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='posts', db_index=False)  # served by posts_author_recent_idx
     image = models.ImageField(upload_to='post_images', validators=[FileExtensionValidator(allowed_extensions=['jpg', 'jpeg', 'png', 'tiff', 'heic', 'heif'])])
     caption = models.TextField(validators=[MaxLengthValidator(2000)])
+    search_vector = SearchVectorField(null=True, editable=False)
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False)  # set by posts.purge.soft_delete_post
+
+    objects = SoftDeleteManager.from_queryset(PostQuerySet)()
+    all_objects = PostQuerySet.as_manager()
+    search_source_field = 'caption'
 
     class Meta:
         db_table = 'posts'
         verbose_name = 'post'
         verbose_name_plural = 'posts'
+        # PostgreSQL also has posts_search_vector_idx (GIN), created by migration 0002 outside the model state.
+        indexes = [
+            models.Index(fields=['-created_at'], name='posts_recent_idx'),
+            models.Index(fields=['author', '-created_at'], name='posts_author_recent_idx'),  # profile grid
+        ]
 
     def __str__(self):
         return f"Post {self.id} - {self.author.username}"
 
 
-class Comment(BaseModel):
+class PostMedia(BaseModel):
+    # The images of a carousel post in display order; Post.image holds the first one as the cover.
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='media', db_index=False)  # served by post_media_position
+    image = models.ImageField(upload_to='post_images', validators=[FileExtensionValidator(allowed_extensions=['jpg', 'jpeg', 'png', 'tiff', 'heic', 'heif'])])
+    position = models.PositiveSmallIntegerField()
+    width = models.PositiveIntegerField(null=True, blank=True, editable=False)  # set by posts.tasks.process_post_media
+    height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+
+    class Meta:
+        ordering = ['position']
+        verbose_name_plural = 'post media'
+        constraints = [
+            UniqueConstraint(
+                fields=['post', 'position'],
+                name='post_media_position'
+            )
+        ]
+
+
+class Comment(SearchVectorMixin, BaseModel):
     author = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
-    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='comments')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='comments', db_index=False)  # served by comments_post_parent_idx
     comment_text = models.TextField()
     parent = models.ForeignKey('self', on_delete=models.CASCADE, related_name='child', null=True, blank=True)  # comment1.child.all() gives us all replies to this comment
+    search_vector = SearchVectorField(null=True, editable=False)
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False)  # set by posts.purge.soft_delete_comment
+
+    objects = SoftDeleteManager.from_queryset(CommentQuerySet)()
+    all_objects = CommentQuerySet.as_manager()
+    search_source_field = 'comment_text'
+
+    class Meta:
+        # PostgreSQL also has comments_search_vector_idx (GIN), created by migration 0002 outside the model state.
+        indexes = [
+            models.Index(fields=['post', 'parent', 'created_at'], name='comments_post_parent_idx'),
+        ]
 
     def __str__(self):
         return f'Comment by {self.author}'
@@ -43,8 +135,9 @@ class Comment(BaseModel):
 
 
 class PostLike(BaseModel):
-    author = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
-    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='likes')
+    # Hash-partitioned by post on PostgreSQL (migration 0009), so a post's likes live in one partition.
+    author = models.ForeignKey(CustomUser, on_delete=models.CASCADE, db_index=False)  # served by PostLike Constraint
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='likes', db_index=False)  # served by post_likes_post_created_idx
 
     class Meta:
         constraints = [
@@ -53,11 +146,15 @@ class PostLike(BaseModel):
                 name='PostLike Constraint'
             )
         ]
+        indexes = [
+            models.Index(fields=['post', 'created_at'], name='post_likes_post_created_idx'),
+        ]
 
 
 class CommentLike(BaseModel):
-    author = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
-    comment = models.ForeignKey(Comment, on_delete=models.CASCADE, related_name='likes')
+    # Hash-partitioned by comment on PostgreSQL (migration 0009).
+    author = models.ForeignKey(CustomUser, on_delete=models.CASCADE, db_index=False)  # served by CommentLike Constraint
+    comment = models.ForeignKey(Comment, on_delete=models.CASCADE, related_name='likes', db_index=False)  # served by comment_likes_comment_idx
 
     class Meta:
         constraints = [
@@ -66,3 +163,77 @@ class CommentLike(BaseModel):
                 name='CommentLike Constraint'
             )
         ]
+        indexes = [
+            models.Index(fields=['comment', 'author'], name='comment_likes_comment_idx'),
+        ]
+
+
+class Hashtag(BaseModel):
+    name = models.CharField(max_length=100, unique=True)  # lowercase, without the leading '#'
+    post_count = models.PositiveIntegerField(default=0)  # maintained by posts.tasks.extract_post_entities
+
+    def __str__(self):
+        return f'#{self.name}'
+
+
+class PostHashtag(BaseModel):
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='post_hashtags')
+    hashtag = models.ForeignKey(Hashtag, on_delete=models.CASCADE, related_name='post_hashtags')
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(
+                fields=['hashtag', 'post'],
+                name='PostHashtag Constraint'
+            )
+        ]
+        indexes = [
+            models.Index(fields=['hashtag', '-created_at'], name='post_hashtags_recent_idx'),
+        ]
+
+
+class Mention(BaseModel):
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='mentions')
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='mentions')
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(
+                fields=['user', 'post'],
+                name='Mention Constraint'
+            )
+        ]
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='mentions_recent_idx'),
+        ]
+
+
+class PostScore(models.Model):
+    # Time-decayed engagement, stored as ln(sum of weight * 2^(age from TRENDING_EPOCH / half-life)); see posts.trending.
+    post = models.OneToOneField(Post, on_delete=models.CASCADE, primary_key=True, related_name='score')
+    score = models.FloatField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-score'], name='post_scores_score_idx'),
+        ]
+
+
+class TrendingPost(models.Model):
+    # Snapshot of the top PostScore rows, replaced as a whole by posts.trending.refresh_trending().
+    rank = models.PositiveSmallIntegerField(primary_key=True)
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+
+
+class ExploreCandidates(models.Model):
+    # Precomputed by posts.explore.update_candidates(); post ids are ordered best first.
+    user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, primary_key=True, related_name='explore_candidates')
+    post_ids = models.JSONField(default=list)
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+class JobWatermark(models.Model):
+    # How far an incremental background job has read, e.g. the created_at of the last likes it processed.
+    name = models.CharField(max_length=100, primary_key=True)
+    position = models.DateTimeField()
@@ -0,0 +1,164 @@
+"""
+Soft deletion of posts and comments.
+
+Deleting marks the row with deleted_at, which the default managers hide, and schedules the physical cascade.
+That UPDATE fires no delete signals, so the profile counters, trending scores and stream events are adjusted here.
+The cascade runs in a Celery task as raw, bounded statements (DELETE ... WHERE id IN (SELECT id ... LIMIT n)), each in
+its own transaction, so a viral post never loads its children into memory or holds their locks for long.
+"""
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from shared.outbox import enqueue
+from users.models import UserStats
+from . import signals, tasks, trending
+from .models import Post, PostMedia, Comment, PostLike, CommentLike, Hashtag, PostHashtag, Mention, PostScore, TrendingPost
+
+
+def table(model):
+    return connection.ops.quote_name(model._meta.db_table)
+
+
+def column(model, field_name):
+    return connection.ops.quote_name(model._meta.get_field(field_name).column)
+
+
+def batch_size():
+    return getattr(settings, 'PURGE_BATCH_SIZE', 1000)
+
+
+def run_in_batches(sql, params):
+    # `sql` must touch at most LIMIT %s rows; it is repeated until a batch comes back short.
+    total = 0
+    while True:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(sql, [*params, batch_size()])
+            count = cursor.rowcount  # psycopg 3 reports -1 once the cursor is closed
+        total += count
+        if count < batch_size():
+            return total
+
+
+def delete_where(model, condition, params):
+    pk = connection.ops.quote_name(model._meta.pk.column)
+    return run_in_batches(
+        # The condition is repeated outside the subquery so PostgreSQL can prune partitions (see HashPartition).
+        f'DELETE FROM {table(model)} WHERE {condition} AND {pk} IN '
+        f'(SELECT {pk} FROM {table(model)} WHERE {condition} LIMIT %s)',
+        [*params, *params],
+    )
+
+
+def detach_replies(condition, params):
+    # Comment.parent is a deferred FK without ON DELETE CASCADE; clearing it lets comments go in any batch order.
+    parent, pk = column(Comment, 'parent'), column(Comment, 'id')
+    return run_in_batches(
+        f'UPDATE {table(Comment)} SET {parent} = NULL WHERE {pk} IN '
+        f'(SELECT {pk} FROM {table(Comment)} WHERE {condition} AND {parent} IS NOT NULL LIMIT %s)',
+        params,
+    )
+
+
+def soft_delete_post(post):
+    with transaction.atomic():
+        if not Post.objects.filter(id=post.id).update(deleted_at=timezone.now()):
+            return  # already deleted
+        UserStats.add(post.author_id, post_count=-1)
+        # Off the trending list now rather than after the purge; recompute_scores() skips deleted posts.
+        PostScore.objects.filter(post_id=post.id).delete()
+        TrendingPost.objects.filter(post_id=post.id).delete()
+        signals.publish_post_event(post.id, {'type': 'post_deleted'})
+        enqueue(tasks.purge_post_task, post.id)
+
+
+def soft_delete_comment(comment):
+    # Replies disappear with the comment, as they did with the CASCADE of a real delete.
+    now = timezone.now()
+    with transaction.atomic():
+        created = []  # created_at of every comment deleted here
+        ids = [comment.id]
+        while ids:
+            # The lock makes a concurrent delete of the same thread skip the comments this one takes down.
+            rows = list(Comment.objects.select_for_update().filter(id__in=ids).values_list('id', 'created_at'))
+            ids = [comment_id for comment_id, _ in rows]
+            Comment.objects.filter(id__in=ids).update(deleted_at=now)
+            created += [created_at for _, created_at in rows]
+            ids = list(Comment.objects.filter(parent_id__in=ids).values_list('id', flat=True))
+        if not created:
+            return  # already deleted
+        trending.remove_engagement(comment.post_id, trending.COMMENT_WEIGHT, created)
+        signals.publish_post_event(comment.post_id, {'type': 'comment', 'delta': -len(created)})
+        enqueue(tasks.purge_comments_task, comment.post_id)
+
+
+def db_post_id(post_id):
+    # Raw SQL gets no field conversion: UUIDs are stored as char(32) on backends without a uuid type.
+    return Post._meta.pk.get_db_prep_value(post_id, connection)
+
+
+def purge_post(post_id):
+    db_id = db_post_id(post_id)
+    delete_children(db_id)
+    with transaction.atomic():
+        # A like or comment whose request saw the post just before it was deleted can land after the batches above.
+        # The row lock waits for such writers (their foreign key check holds a share lock on the post) and keeps new
+        # ones out, so the second pass, almost always empty, leaves nothing referencing the post.
+        Post.all_objects.select_for_update().filter(id=post_id).exists()
+        delete_children(db_id)
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {table(Post)} WHERE {column(Post, "id")} = %s', [db_id])
+
+
+def delete_children(post_id):
+    post = column(Comment, 'post')
+    comments = f'SELECT {column(Comment, "id")} FROM {table(Comment)} WHERE {post} = %s'
+    delete_where(CommentLike, f'{column(CommentLike, "comment")} IN ({comments})', [post_id])
+    delete_where(PostLike, f'{column(PostLike, "post")} = %s', [post_id])
+    detach_replies(f'{post} = %s', [post_id])
+    delete_where(Comment, f'{post} = %s', [post_id])
+
+    delete_post_hashtags(post_id)
+    for model in (PostMedia, Mention, PostScore, TrendingPost):
+        delete_where(model, f'{column(model, "post")} = %s', [post_id])
+
+
+def delete_post_hashtags(post_id):
+    # Each batch decrements the counts of the tags it deleted, in the same transaction: a purge that fails halfway
+    # or is redelivered never takes a post off a tag's count twice.
+    post, pk, hashtag = column(PostHashtag, 'post'), column(PostHashtag, 'id'), column(PostHashtag, 'hashtag')
+    count = column(Hashtag, 'post_count')
+    while True:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {table(PostHashtag)} WHERE {pk} IN '
+                f'(SELECT {pk} FROM {table(PostHashtag)} WHERE {post} = %s LIMIT %s) RETURNING {hashtag}',
+                [post_id, batch_size()],
+            )
+            hashtag_ids = [row[0] for row in cursor.fetchall()]  # a post links each tag once
+            if hashtag_ids:
+                cursor.execute(
+                    f'UPDATE {table(Hashtag)} SET {count} = {count} - 1 WHERE {column(Hashtag, "id")} IN '
+                    f'({", ".join(["%s"] * len(hashtag_ids))})',
+                    hashtag_ids,
+                )
+        if len(hashtag_ids) < batch_size():
+            return
+
+
+def purge_comments(post_id):
+    # Soft-deleted comments of a post that is still alive.
+    post_id = db_post_id(post_id)
+    deleted = f'{column(Comment, "post")} = %s AND {column(Comment, "deleted_at")} IS NOT NULL'
+    comments = f'SELECT {column(Comment, "id")} FROM {table(Comment)} WHERE {deleted}'
+    delete_where(CommentLike, f'{column(CommentLike, "comment")} IN ({comments})', [post_id])
+    detach_replies(deleted, [post_id])
+    delete_where(Comment, deleted, [post_id])
+
+
+def purge_deleted():
+    # Sweeps whatever the per-delete tasks missed, e.g. when the broker was down.
+    for post_id in Post.all_objects.exclude(deleted_at=None).values_list('id', flat=True):
+        purge_post(post_id)
+    for post_id in Comment.all_objects.exclude(deleted_at=None).values_list('post_id', flat=True).distinct():
+        purge_comments(post_id)
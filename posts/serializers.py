@@ -1,6 +1,12 @@
+from django.conf import settings
+from django.core.validators import FileExtensionValidator
+from django.db import transaction
 from rest_framework import serializers
-from posts.models import Post, PostLike, Comment, CommentLike
+from posts.models import Post, PostMedia, PostLike, Comment, CommentLike, Hashtag
 from users.models import CustomUser
+from shared.outbox import enqueue
+from shared.serialization import compile_serializer
+from .tasks import process_carousel_media
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -11,33 +17,84 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ['id', 'username', 'photo']
 
 
+class PostMediaSerializer(serializers.ModelSerializer):
+    id = serializers.UUIDField(read_only=True)
+
+    class Meta:
+        model = PostMedia
+        fields = ['id', 'image', 'position', 'width', 'height']
+
+
 class PostSerializer(serializers.ModelSerializer):
     id = serializers.UUIDField(read_only=True)
     author = UserSerializer(read_only=True)
+    media = PostMediaSerializer(many=True, read_only=True)  # empty unless the post is a carousel
     post_likes_count = serializers.SerializerMethodField(method_name='get_post_likes_count')
     post_comments_count = serializers.SerializerMethodField(method_name='get_post_comments_count')
     me_liked = serializers.SerializerMethodField()
 
     class Meta:
         model = Post
-        fields = ['id', 'author', 'image', 'caption', 'created_at', 'post_likes_count', 'post_comments_count', 'me_liked']
+        fields = ['id', 'author', 'image', 'media', 'caption', 'created_at', 'post_likes_count', 'post_comments_count', 'me_liked']
         extra_kwargs = {'image': {'required': False}}
 
+    # The post_save handlers write the post's score, its author's post count and the outbox row of
+    # extract_post_entities: all of them commit or roll back with the post.
+    def create(self, validated_data):
+        with transaction.atomic():
+            return super().create(validated_data)
+
+    def update(self, instance, validated_data):
+        with transaction.atomic():
+            return super().update(instance, validated_data)
+
+    # Querysets built with Post.objects.with_stats() carry these values already, others fall back to a query per post.
     def get_post_likes_count(self, obj):
+        if hasattr(obj, 'likes_count'):
+            return obj.likes_count
         return obj.likes.count()
 
     def get_post_comments_count(self, obj):
+        if hasattr(obj, 'comments_count'):
+            return obj.comments_count
         return obj.comments.count()
 
     def get_me_liked(self, obj):
         # print(self.context)
         request = self.context.get('request', None)
         if request and request.user.is_authenticated:
+            if hasattr(obj, 'viewer_liked'):
+                return obj.viewer_liked
             return PostLike.objects.filter(author=request.user, post=obj).exists()
 
         return False
 
 
+class CarouselPostSerializer(PostSerializer):
+    images = serializers.ListField(
+        child=serializers.ImageField(validators=[FileExtensionValidator(allowed_extensions=['jpg', 'jpeg', 'png', 'tiff', 'heic', 'heif'])]),
+        min_length=2,
+        max_length=settings.CAROUSEL_MAX_IMAGES,
+        write_only=True,
+    )
+
+    class Meta(PostSerializer.Meta):
+        fields = [*PostSerializer.Meta.fields, 'images']
+        read_only_fields = ['image']
+
+    def create(self, validated_data):
+        images = validated_data.pop('images')
+        with transaction.atomic():
+            # The cover is stored once and shared by the post and its first media row.
+            post = Post.objects.create(image=images[0], **validated_data)
+            media = PostMedia.objects.bulk_create([
+                PostMedia(post=post, image=post.image.name if position == 0 else image, position=position)
+                for position, image in enumerate(images)
+            ])
+            enqueue(process_carousel_media, [item.id for item in media])
+        return post
+
+
 class CommentSerializer(serializers.ModelSerializer):
     id = serializers.UUIDField(read_only=True)
     author = UserSerializer(read_only=True)
@@ -51,8 +108,15 @@ class CommentSerializer(serializers.ModelSerializer):
 
 
     def get_replies(self, obj):
-        if obj.child.exists():
-            serializer = self.__class__(obj.child.all(), many=True, context=self.context)  # self.__class__ -> CommentSerializer
+        if hasattr(obj, 'prefetched_replies'):  # set by attach_replies()
+            replies = obj.prefetched_replies
+        elif obj.child.exists():
+            replies = obj.child.all()
+        else:
+            replies = None
+
+        if replies:
+            serializer = self.__class__(replies, many=True, context=self.context)  # self.__class__ -> CommentSerializer
             return serializer.data
 
         return None
@@ -62,15 +126,38 @@ class CommentSerializer(serializers.ModelSerializer):
         user = self.context.get('request').user
 
         if user.is_authenticated:
+            if hasattr(obj, 'viewer_liked'):
+                return obj.viewer_liked
             return obj.likes.filter(author=user).exists()
 
         return False
 
 
     def get_likes_count(self, obj):
+        if hasattr(obj, 'likes_count'):
+            return obj.likes_count
         return obj.likes.count()
 
 
+class CommentSearchSerializer(CommentSerializer):
+    replies = None  # search results are flat
+
+    class Meta(CommentSerializer.Meta):
+        fields = ['id', 'author', 'post', 'comment_text', 'parent', 'me_liked', 'comment_likes_count']
+
+
+def attach_replies(comments):
+    # Builds the reply tree of an already fetched list of comments, so get_replies() runs no queries.
+    by_id = {comment.id: comment for comment in comments}
+    for comment in comments:
+        comment.prefetched_replies = []
+    for comment in comments:
+        parent = by_id.get(comment.parent_id)
+        if parent is not None:
+            parent.prefetched_replies.append(comment)
+    return comments
+
+
 class PostLikeSerializer(serializers.ModelSerializer):
     id = serializers.UUIDField(read_only=True)
     author = UserSerializer(read_only=True)
@@ -86,4 +173,39 @@ class CommentLikeSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = CommentLike
-        fields = ['id', 'author', 'comment']
\ No newline at end of file
+        fields = ['id', 'author', 'comment']
+
+
+class HashtagSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Hashtag
+        fields = ['name', 'post_count']
+
+
+class PostGridSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Post
+        fields = ['id', 'image', 'created_at']
+
+
+# Read-only twins of the serializers above for list endpoints, see shared.serialization. They expect querysets
+# built with with_stats() (comments also passed through attach_replies()) and produce identical output.
+PostReadSerializer = compile_serializer(
+    PostSerializer,
+    post_likes_count='obj.likes_count',
+    post_comments_count='obj.comments_count',
+    me_liked='obj.viewer_liked if request is not None and request.user.is_authenticated else False',
+)
+CommentReadSerializer = compile_serializer(
+    CommentSerializer,
+    replies='[CommentSerializer_to_dict(reply, request) for reply in obj.prefetched_replies] or None',
+    me_liked='obj.viewer_liked if request.user.is_authenticated else False',
+    comment_likes_count='obj.likes_count',
+)
+CommentSearchReadSerializer = compile_serializer(
+    CommentSearchSerializer,
+    me_liked='obj.viewer_liked if request.user.is_authenticated else False',
+    comment_likes_count='obj.likes_count',
+)
+PostLikeReadSerializer = compile_serializer(PostLikeSerializer)
+CommentLikeReadSerializer = compile_serializer(CommentLikeSerializer)
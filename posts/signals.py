@@ -0,0 +1,72 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from shared.outbox import enqueue
+from shared.pubsub import get_broker
+from users.models import UserStats
+from .models import Post, PostLike, Comment, PostHashtag, Hashtag
+from .tasks import extract_post_entities
+from . import trending
+
+
+def post_channel(post_id):
+    return f'post:{post_id}'
+
+
+def publish_post_event(post_id, message):
+    # Subscribers only hear about committed changes.
+    transaction.on_commit(lambda: get_broker().publish(post_channel(post_id), message))
+
+
+@receiver(post_save, sender=PostLike)
+def post_like_created(sender, instance, created, **kwargs):
+    if created:
+        publish_post_event(instance.post_id, {'type': 'like', 'delta': 1})
+        transaction.on_commit(lambda: trending.record_engagement(instance.post_id, trending.LIKE_WEIGHT, instance.created_at))
+
+
+@receiver(post_delete, sender=PostLike)
+def post_like_deleted(sender, instance, **kwargs):
+    publish_post_event(instance.post_id, {'type': 'like', 'delta': -1})
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: trending.record_engagement(instance.post_id, trending.COMMENT_WEIGHT, instance.created_at))
+        publish_post_event(instance.post_id, {
+            'type': 'comment',
+            'delta': 1,
+            'comment': {
+                'id': str(instance.id),
+                'author_id': str(instance.author_id),
+                'parent_id': str(instance.parent_id) if instance.parent_id else None,
+            },
+        })
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    publish_post_event(instance.post_id, {'type': 'comment', 'delta': -1})
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, update_fields=None, **kwargs):
+    if created:
+        trending.create_post_score(instance)
+        UserStats.add(instance.author_id, post_count=1)
+    if created or update_fields is None or 'caption' in update_fields:
+        enqueue(extract_post_entities, instance.id)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    if instance.deleted_at is None:  # soft_delete_post() already took it off the count
+        UserStats.add(instance.author_id, post_count=-1)
+
+
+@receiver(post_delete, sender=PostHashtag)
+def post_hashtag_deleted(sender, instance, **kwargs):
+    Hashtag.objects.filter(id=instance.hashtag_id).update(post_count=F('post_count') - 1)
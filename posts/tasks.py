@@ -0,0 +1,112 @@
+import re
+
+from celery import group
+from django.db import transaction
+from django.db.models import F
+from PIL import ExifTags, Image, UnidentifiedImageError
+
+from instagram_clone.celery import app
+from users.models import CustomUser
+from . import explore, purge, trending
+from .models import Post, PostMedia, Hashtag, PostHashtag, Mention
+
+hashtag_regex = re.compile(r'(?<![\w#])#(\w{1,100})')
+mention_regex = re.compile(r'(?<![\w.@])@([a-zA-Z0-9_.-]{1,150})')  # same characters as shared.utils.username_regex
+
+
+def parse_caption(caption):
+    hashtags = {name.lower() for name in hashtag_regex.findall(caption)}
+    usernames = {username.rstrip('.') for username in mention_regex.findall(caption)}
+    return hashtags, usernames - {''}
+
+
+@app.task(acks_late=True)
+def extract_post_entities(post_id):
+    with transaction.atomic():
+        # Locking the post serializes concurrent extractions of the same post, which keeps post_count exact.
+        post = Post.objects.select_for_update().filter(id=post_id).only('id', 'caption').first()
+        if post is None:
+            return
+
+        hashtags, usernames = parse_caption(post.caption)
+        sync_post_hashtags(post, hashtags)
+        sync_mentions(post, usernames)
+
+
+def sync_post_hashtags(post, names):
+    current = dict(PostHashtag.objects.filter(post=post).values_list('hashtag__name', 'id'))
+    added = names - current.keys()
+    removed = current.keys() - names
+
+    if added:
+        Hashtag.objects.bulk_create([Hashtag(name=name) for name in added], ignore_conflicts=True)
+        hashtag_ids = list(Hashtag.objects.filter(name__in=added).values_list('id', flat=True))
+        PostHashtag.objects.bulk_create([PostHashtag(post=post, hashtag_id=hashtag_id) for hashtag_id in hashtag_ids])
+        Hashtag.objects.filter(id__in=hashtag_ids).update(post_count=F('post_count') + 1)
+
+    if removed:
+        # The post_delete receiver of PostHashtag decrements post_count, also when a post is deleted.
+        PostHashtag.objects.filter(id__in=[current[name] for name in removed]).delete()
+
+
+def sync_mentions(post, usernames):
+    user_ids = set(CustomUser.objects.by_usernames(usernames).values_list('id', flat=True)) if usernames else set()
+    current = set(Mention.objects.filter(post=post).values_list('user_id', flat=True))
+
+    if user_ids - current:
+        Mention.objects.bulk_create([Mention(post=post, user_id=user_id) for user_id in user_ids - current])
+    if current - user_ids:
+        Mention.objects.filter(post=post, user_id__in=current - user_ids).delete()
+
+
+@app.task(ignore_result=True, acks_late=True)
+def recompute_post_scores():
+    trending.recompute_scores()
+    trending.refresh_trending()
+
+
+@app.task(ignore_result=True, acks_late=True)
+def refresh_trending_posts():
+    trending.refresh_trending()
+
+
+@app.task(ignore_result=True, acks_late=True)
+def update_explore_candidates():
+    explore.update_candidates()
+
+
+@app.task(ignore_result=True, acks_late=True)
+def purge_post_task(post_id):
+    purge.purge_post(post_id)
+
+
+@app.task(ignore_result=True, acks_late=True)
+def purge_comments_task(post_id):
+    purge.purge_comments(post_id)
+
+
+@app.task(ignore_result=True, acks_late=True)
+def purge_deleted_content():
+    purge.purge_deleted()
+
+
+@app.task(ignore_result=True, acks_late=True)
+def process_carousel_media(media_ids):
+    # One message per upload; the images are then processed side by side.
+    group(process_post_media.s(media_id) for media_id in media_ids).apply_async()
+
+
+@app.task(ignore_result=True, acks_late=True)
+def process_post_media(media_id):
+    media = PostMedia.objects.filter(id=media_id).only('id', 'image').first()
+    if media is None:
+        return
+    try:
+        # Only the header is read; the pixels are not decoded.
+        with media.image.open('rb'), Image.open(media.image) as image:
+            width, height = image.size
+            if image.getexif().get(ExifTags.Base.Orientation) in (5, 6, 7, 8):  # displayed rotated by 90 degrees
+                width, height = height, width
+    except (FileNotFoundError, UnidentifiedImageError):  # e.g. HEIC without a Pillow plugin
+        return
+    PostMedia.objects.filter(id=media_id).update(width=width, height=height)
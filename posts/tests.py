@@ -1,3 +1,430 @@
-from django.test import TestCase
+import io
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import AnonymousUser
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DatabaseError
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import ExifTags, Image
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from shared.models import uuid7
+from shared.pubsub import get_broker
+from shared.renderers import dumps
+from shared.testing import plan_problems, requires_postgresql
+from users.models import CustomUser, UserStats
+from . import explore, serializers, tasks, trending, views
+from .async_views import PostEventStreamView
+from .models import Post, PostMedia, Comment, PostLike, CommentLike, Hashtag, PostHashtag, Mention, PostScore, \
+    TrendingPost, AUTHOR_FIELDS
+from .purge import purge_post, soft_delete_comment, soft_delete_post
+
+PAGE = 11  # page size + 1, as fetched by the paginators
+
+
+def api_request(user):
+    request = Request(RequestFactory().get('/'))
+    request.user = user
+    return request
+
+
+def view_queryset(view_class, user, query=None, **kwargs):
+    view = view_class()
+    view.request = Request(RequestFactory().get('/', query or {}))
+    view.request.user = user
+    view.kwargs = kwargs
+    view.format_kwarg = None
+    return view.get_queryset()
+
+
+@requires_postgresql
+class QueryPlanTests(TestCase):
+    """The querysets behind the posts endpoints must not fall back to sequential scans or to sorts an index provides."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create(username='plan-user', email='plan-user@example.com', auth_type='via_email')
+        cls.post = Post.objects.create(author=cls.user, image='post_images/plan.jpg', caption='seeded post #plans')
+        cls.comment = Comment.objects.create(author=cls.user, post=cls.post, comment_text='seeded comment')
+        Comment.objects.create(author=cls.user, post=cls.post, parent=cls.comment, comment_text='seeded reply')
+        PostLike.objects.create(author=cls.user, post=cls.post)
+        CommentLike.objects.create(author=cls.user, comment=cls.comment)
+        cls.hashtag = Hashtag.objects.create(name='plans', post_count=1)
+        PostHashtag.objects.create(post=cls.post, hashtag=cls.hashtag)
+        Mention.objects.create(post=cls.post, user=cls.user)
+        TrendingPost.objects.create(rank=1, post=cls.post, score=1)
+
+    def checks(self):
+        # (name, queryset, whether the order must come from an index)
+        user, post, comment = self.user, self.post, self.comment
+        return [
+            ('post list', view_queryset(views.PostListCreateAPIView, user)[:PAGE], True),
+            ('post detail', view_queryset(views.PostRetrieveUpdateDestroyAPIView, user).filter(id=post.id), True),
+            ('comment thread', view_queryset(views.CommentListCreateAPIView, user, id=post.id), False),
+            ('comment replies', Comment.objects.with_stats(user).filter(post_id=post.id, parent_id=comment.id)
+                .order_by('created_at')[:PAGE], True),
+            ('comment detail', Comment.objects.filter(post_id=post.id, id=comment.id), True),
+            ('post likes', view_queryset(views.PostLikeListCreateDestroyAPIView, user, id=post.id), True),
+            ('comment likes', comment.likes.all(), True),
+            ('viewer comment like', comment.likes.filter(author=user), True),
+            ('profile grid', Post.objects.filter(author_id=user.id).order_by('-created_at')[:PAGE], True),
+            ('post search', view_queryset(views.PostSearchAPIView, user, {'q': 'seeded post'})[:PAGE], False),
+            ('comment search', view_queryset(views.CommentSearchAPIView, user, {'q': 'seeded comment'})[:PAGE], False),
+            ('trending', view_queryset(views.TrendingPostListAPIView, user).order_by('rank')[:PAGE], True),
+            ('mentions', view_queryset(views.MentionPostListAPIView, user).order_by('-created_at')[:PAGE], True),
+            ('hashtag posts', view_queryset(views.HashtagPostListAPIView, user, name=self.hashtag.name)
+                .order_by('-created_at')[:PAGE], True),
+        ]
+
+    def test_hot_paths_use_indexes(self):
+        for name, queryset, index_order in self.checks():
+            with self.subTest(name):
+                self.assertEqual(plan_problems(queryset, index_order), [])
+
+
+class AuthorFieldsTests(TestCase):
+    """Read paths load the author columns the serializers render, not password hashes, emails or phone numbers."""
+
+    def test_only_author_fields_are_loaded(self):
+        user = CustomUser.objects.create(username='author', email='author@example.com', auth_type='via_email')
+        post = Post.objects.create(author=user, image='post_images/author.jpg', caption='caption')
+        Comment.objects.create(author=user, post=post, comment_text='comment')
+        PostLike.objects.create(author=user, post=post)
+        querysets = [  # (name, queryset, queries: the posts prefetch their media)
+            ('posts', view_queryset(views.PostListCreateAPIView, user), 2),
+            ('comments', view_queryset(views.CommentListCreateAPIView, user, id=post.id), 1),
+            ('post likes', view_queryset(views.PostLikeListCreateDestroyAPIView, user, id=post.id), 1),
+        ]
+        author_fields = {field.split('__', 1)[1] for field in AUTHOR_FIELDS}
+        for name, queryset, queries in querysets:
+            with self.subTest(name), self.assertNumQueries(queries):
+                author = list(queryset)[0].author
+                loaded = {field.attname for field in CustomUser._meta.concrete_fields} - author.get_deferred_fields()
+                self.assertEqual(loaded, author_fields)
+
+
+class SoftDeleteTests(TestCase):
+    """Soft deletes are UPDATEs, so purge.py does what the delete signals would have done."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create(username='deleter', email='deleter@example.com', auth_type='via_email')
+        cls.post = Post.objects.create(author=cls.user, image='post_images/delete.jpg', caption='to be deleted')
+        cls.comment = Comment.objects.create(author=cls.user, post=cls.post, comment_text='comment')
+        cls.reply = Comment.objects.create(author=cls.user, post=cls.post, parent=cls.comment, comment_text='reply')
+        cls.other = Comment.objects.create(author=cls.user, post=cls.post, comment_text='other comment')
+
+    def delete(self, function, obj):
+        with mock.patch.object(get_broker(), 'publish') as publish, self.captureOnCommitCallbacks(execute=True):
+            function(obj)
+        return [call.args for call in publish.call_args_list]
+
+    def score_of(self, *objects):
+        return trending.logsumexp([
+            trending.engagement_term(trending.POST_WEIGHT if isinstance(obj, Post) else trending.COMMENT_WEIGHT,
+                                     obj.created_at)
+            for obj in objects
+        ])
+
+    def test_comment_with_replies(self):
+        score = self.score_of(self.post, self.comment, self.reply, self.other)
+        PostScore.objects.filter(post=self.post).update(score=score)
+        events = self.delete(soft_delete_comment, self.comment)
+        self.assertEqual(events, [(f'post:{self.post.id}', {'type': 'comment', 'delta': -2})])
+        self.assertAlmostEqual(PostScore.objects.get(post=self.post).score, self.score_of(self.post, self.other))
+        self.assertEqual(self.delete(soft_delete_comment, self.comment), [])  # already deleted
+
+    def test_post(self):
+        TrendingPost.objects.create(rank=1, post=self.post, score=1)
+        events = self.delete(soft_delete_post, self.post)
+        self.assertEqual(events, [(f'post:{self.post.id}', {'type': 'post_deleted'})])
+        self.assertFalse(PostScore.objects.filter(post_id=self.post.id).exists())
+        self.assertFalse(TrendingPost.objects.exists())
+        self.assertEqual(UserStats.objects.get(user=self.user).post_count, 0)
+
+    def test_deleted_post_has_no_children(self):
+        soft_delete_post(self.post)
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {self.user.token()["access_token"]}'}
+        response = self.client.get(reverse('post-comments', args=[self.post.id]))
+        self.assertEqual((response.status_code, response.json()), (200, []))
+        self.assertEqual(self.client.get(reverse('async-post-comments', args=[self.post.id])).json(), [])
+        self.assertEqual(self.client.get(reverse('post-like', args=[self.post.id])).json(), [])
+        self.assertEqual(self.client.get(
+            reverse('comment-retrieve', args=[self.post.id, self.comment.id])).status_code, 404)
+
+        response = self.client.post(reverse('post-comments', args=[self.post.id]), {'comment_text': 'late'}, **headers)
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.client.post(reverse('post-like', args=[self.post.id]), **headers).status_code, 404)
+        response = self.client.post(reverse('comment-likes', args=[self.post.id, self.comment.id]), **headers)
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(Comment.objects.count(), 3)
+        self.assertFalse(PostLike.objects.exists() or CommentLike.objects.exists())
+
+    def test_purge_removes_children_written_during_it(self):
+        Post.objects.filter(id=self.post.id).update(deleted_at=self.post.created_at)
+        late = []
+
+        def delete_post_hashtags(post_id):
+            # A like whose request checked the post before it was deleted commits after the like batches.
+            if not late:
+                late.append(PostLike.objects.create(author=self.user, post=self.post))
+
+        with mock.patch('posts.purge.delete_post_hashtags', side_effect=delete_post_hashtags):
+            purge_post(self.post.id)
+        self.assertTrue(late)
+        self.assertFalse(PostLike.objects.exists())
+        self.assertFalse(Post.all_objects.exists())
+
+    @override_settings(PURGE_BATCH_SIZE=1)
+    def test_purge_decrements_hashtags_once(self):
+        hashtags = [Hashtag.objects.create(name=name, post_count=2) for name in ('one', 'two', 'three')]
+        PostHashtag.objects.bulk_create(PostHashtag(post=self.post, hashtag=hashtag) for hashtag in hashtags)
+        Post.objects.filter(id=self.post.id).update(deleted_at=self.post.created_at)
+        purge_post(self.post.id)
+        purge_post(self.post.id)  # redelivered task
+        self.assertEqual(list(Hashtag.objects.values_list('post_count', flat=True)), [1, 1, 1])
+        self.assertFalse(PostHashtag.objects.exists())
+
+
+class PostWriteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create(username='writer', email='writer@example.com', auth_type='via_email')
+
+    def test_post_and_outbox_row_commit_together(self):
+        serializer = serializers.PostSerializer()
+        with mock.patch('posts.signals.enqueue', side_effect=DatabaseError), self.assertRaises(DatabaseError):
+            serializer.create({'author': self.user, 'image': 'post_images/write.jpg', 'caption': 'new'})
+        self.assertFalse(Post.objects.exists())
+        self.assertEqual(UserStats.objects.get(user=self.user).post_count, 0)
+
+        post = serializer.create({'author': self.user, 'image': 'post_images/write.jpg', 'caption': 'new'})
+        with mock.patch('posts.signals.enqueue', side_effect=DatabaseError), self.assertRaises(DatabaseError):
+            serializer.update(post, {'caption': 'edited'})
+        self.assertEqual(Post.objects.get().caption, 'new')
+
+
+def image_file(name, size, orientation=None):
+    content = io.BytesIO()
+    exif = Image.Exif()
+    if orientation:
+        exif[ExifTags.Base.Orientation] = orientation
+    Image.new('RGB', size).save(content, 'PNG' if name.endswith('.png') else 'JPEG', exif=exif)
+    return SimpleUploadedFile(name, content.getvalue())
+
+
+@override_settings(CELERY_TASK_ALWAYS_EAGER=True)
+class CarouselUploadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create(username='carousel', email='carousel@example.com', auth_type='via_email')
+
+    def setUp(self):
+        self.enterContext(override_settings(MEDIA_ROOT=self.enterContext(tempfile.TemporaryDirectory())))
+
+    def upload(self, images):
+        token = self.user.token()['access_token']
+        with self.captureOnCommitCallbacks(execute=True):  # runs process_post_media eagerly
+            return self.client.post(reverse('post-carousel-create'), {'caption': 'trip', 'images': images},
+                                    headers={'Authorization': f'Bearer {token}'})
+
+    def test_needs_at_least_two_images(self):
+        for images in ([], [image_file('one.png', (4, 4))]):
+            with self.subTest(images=len(images)):
+                response = self.upload(images)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('images', response.json())
+        self.assertFalse(Post.objects.exists())
+        self.assertFalse(PostMedia.objects.exists())
+
+    def test_media_rows_in_upload_order(self):
+        response = self.upload([image_file('wide.png', (40, 30)), image_file('rotated.jpg', (20, 10), orientation=6),
+                                image_file('square.png', (5, 5))])
+        self.assertEqual(response.status_code, 201)
+        post = Post.objects.get(id=response.json()['id'])
+        media = list(post.media.all())
+        self.assertEqual([item.position for item in media], [0, 1, 2])
+        self.assertEqual([(item.width, item.height) for item in media], [(40, 30), (10, 20), (5, 5)])
+
+        # The cover is stored once, for the post and its first media row.
+        self.assertEqual(media[0].image.name, post.image.name)
+        self.assertEqual(len({item.image.name for item in media}), 3)
+        self.assertEqual(len(post.image.storage.listdir('post_images')[1]), 3)
+
+    def test_unreadable_media_is_left_without_dimensions(self):
+        post = Post.objects.create(author=self.user, image='post_images/cover.jpg')
+        missing = PostMedia.objects.create(post=post, image='post_images/missing.jpg', position=0)
+        invalid = PostMedia.objects.create(post=post, position=1,
+                                           image=ContentFile(b'not an image', name='invalid.heic'))
+        for name, media_id in (('missing file', missing.id), ('not an image', invalid.id), ('deleted row', uuid7())):
+            with self.subTest(name):
+                tasks.process_post_media(media_id)
+        self.assertEqual(list(post.media.values_list('width', 'height')), [(None, None), (None, None)])
+
+
+class ExploreTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            CustomUser.objects.create(username=f'explorer{i}', email=f'explorer{i}@example.com', auth_type='via_email')
+            for i in range(6)
+        ]
+        cls.seed, cls.other, cls.third = [
+            Post.objects.create(author=cls.users[5], image=f'post_images/{name}.jpg', caption=name)
+            for name in ('seed', 'other', 'third')
+        ]
+        comment = Comment.objects.create(author=cls.users[5], post=cls.seed, comment_text='comment')
+        now = timezone.now()
+        for minutes, user in enumerate(cls.users[:4]):  # users[3] liked the seed last
+            like = PostLike.objects.create(author=user, post=cls.seed)
+            PostLike.objects.filter(id=like.id).update(created_at=now - timedelta(minutes=10 - minutes))
+        PostLike.objects.create(author=cls.users[3], post=cls.other)  # after the seed
+        PostLike.objects.create(author=cls.users[0], post=cls.third)
+        CommentLike.objects.create(author=cls.users[4], comment=comment)
+
+    def test_engagers_are_capped_per_post(self):
+        since = timezone.now() - timedelta(days=1)
+        engagers = {self.users[2].id, self.users[3].id, self.users[4].id}
+        self.assertEqual(explore.recent_engagers(since, {self.seed.id}, 2), engagers)
+        with mock.patch.object(explore, 'IN_CHUNK_SIZE', 1):
+            self.assertEqual(explore.recent_engagers(since, {self.seed.id, self.other.id}, 2), engagers)
+
+    def test_engagements_are_capped_per_user(self):
+        since = timezone.now() - timedelta(days=1)
+        users = [self.users[3].id, self.users[4].id]
+        self.assertEqual(len(explore.engagements(since, users)), 3)
+        with mock.patch.object(explore, 'IN_CHUNK_SIZE', 1):
+            self.assertCountEqual(explore.engagements(since, users, per_user=1), [
+                (self.users[3].id, self.other.id, explore.POST_LIKE_WEIGHT),
+                (self.users[4].id, self.seed.id, explore.COMMENT_LIKE_WEIGHT),
+            ])
+
+    def test_seeds_are_capped_per_user(self):
+        since = timezone.now() - timedelta(days=1)
+        # users[3] reaches 'third' through the seed and users[0]...
+        explore.update_batch([self.users[3].id], since)
+        self.assertEqual(explore.candidate_post_ids(self.users[3]), [self.third.id])
+        # ... but only their latest like, of 'other', seeds the scores with a cap of one.
+        with override_settings(EXPLORE_SEEDS_PER_USER=1):
+            explore.update_batch([self.users[3].id], since)
+        self.assertEqual(explore.candidate_post_ids(self.users[3]), [])
+
+    @override_settings(EXPLORE_ENGAGERS_PER_POST=1)
+    def test_batch_users_outside_the_cap_get_candidates(self):
+        explore.update_batch([self.users[0].id], timezone.now() - timedelta(days=1))
+        self.assertEqual(explore.candidate_post_ids(self.users[0]), [self.other.id])
+
+
+class AsyncViewParityTests(TestCase):
+    """The async read views must answer like the DRF views they mirror, errors included."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create(username='reader', email='reader@example.com', auth_type='via_email')
+        cls.posts = [
+            Post.objects.create(author=cls.user, image=f'post_images/{i}.jpg', caption=f'post {i}') for i in range(3)
+        ]
+        comment = Comment.objects.create(author=cls.user, post=cls.posts[0], comment_text='comment')
+        Comment.objects.create(author=cls.user, post=cls.posts[0], parent=comment, comment_text='reply')
+        PostLike.objects.create(author=cls.user, post=cls.posts[0])
+        CommentLike.objects.create(author=cls.user, comment=comment)
+        cls.deleted = Post.objects.create(author=cls.user, image='post_images/deleted.jpg', caption='deleted')
+        Comment.objects.create(author=cls.user, post=cls.deleted, comment_text='hidden')
+        Post.all_objects.filter(id=cls.deleted.id).update(deleted_at=timezone.now())
+
+    def assertSameResponse(self, path, query=None, **headers):
+        drf = self.client.get(f'/posts/{path}', query, headers=headers)
+        native = self.client.get(f'/posts/async/{path}', query, headers=headers)
+        self.assertEqual(native.status_code, drf.status_code)
+        self.assertEqual(native['Content-Type'], drf['Content-Type'])
+        # Page links point at the endpoint that served them.
+        self.assertEqual(native.content.replace(b'/posts/async/', b'/posts/'), drf.content)
+
+    def test_responses_match(self):
+        token = {'Authorization': f'Bearer {self.user.token()["access_token"]}'}
+        paths = ['', f'{self.posts[0].id}/', f'{self.posts[0].id}/comments/', f'{self.posts[0].id}/likes/']
+        for headers in ({}, token):
+            for path in paths:
+                with self.subTest(path=path, authenticated=bool(headers)):
+                    self.assertSameResponse(path, **headers)
+
+    def test_pages(self):
+        for page in ('1', '2', 'last', '3', '4', '0', 'x', ''):
+            with self.subTest(page=page):
+                self.assertSameResponse('', {'page': page, 'page_size': 1})
+        self.assertEqual(self.client.get('/posts/async/', {'page': 4, 'page_size': 1}).json(),
+                         {'detail': 'Invalid page.'})
+
+    def test_missing_and_deleted_posts(self):
+        for post_id in (self.deleted.id, uuid7()):
+            for path in (f'{post_id}/', f'{post_id}/comments/', f'{post_id}/likes/'):
+                with self.subTest(path=path):
+                    self.assertSameResponse(path)
+
+    def test_invalid_token(self):
+        self.assertSameResponse('', Authorization='Bearer invalid')
+
+
+class StreamCoalesceTests(SimpleTestCase):
+    def test_deleted_posts(self):
+        events = dict(PostEventStreamView.coalesce([
+            ('post:a', {'type': 'comment', 'delta': -2}),
+            ('post:b', {'type': 'post_deleted'}),
+        ]))
+        self.assertEqual(events, {'counts': {'a': {'likes': 0, 'comments': -2}}, 'deleted': ['b']})
+
+
+class CompiledSerializerTests(TestCase):
+    """The compiled serializers rendered by ORJSONRenderer must produce the bytes DRF produces."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.viewer = CustomUser.objects.create(username='viewer', email='viewer@example.com', auth_type='via_email')
+        author = CustomUser.objects.create(username='autor', email='autor@example.com', auth_type='via_email',
+                                           photo='user_images/autor.jpg')
+        cls.post = Post.objects.create(author=author, image='post_images/one.jpg', caption='Ünïcödé 🙂 \u2028 "quoted"')
+        carousel = Post.objects.create(author=cls.viewer, image='post_images/cover.jpg', caption='carousel')
+        PostMedia.objects.bulk_create(
+            PostMedia(post=carousel, image=f'post_images/{position}.jpg', position=position, width=1080, height=1350)
+            for position in range(2)
+        )
+        PostLike.objects.create(author=cls.viewer, post=cls.post)
+        PostLike.objects.create(author=author, post=cls.post)
+        cls.comment = Comment.objects.create(author=author, post=cls.post, comment_text='first \u2029 comment')
+        reply = Comment.objects.create(author=cls.viewer, post=cls.post, parent=cls.comment, comment_text='reply')
+        Comment.objects.create(author=author, post=cls.post, parent=reply, comment_text='nested reply')
+        Comment.objects.create(author=cls.viewer, post=cls.post, comment_text='second comment')
+        CommentLike.objects.create(author=cls.viewer, comment=cls.comment)
+
+    def cases(self, user):
+        posts = Post.objects.with_stats(user).order_by('-created_at')
+        comments = Comment.objects.with_stats(user).filter(post=self.post).order_by('created_at')
+        return [
+            ('posts', serializers.PostSerializer, serializers.PostReadSerializer, posts),
+            ('comments', serializers.CommentSerializer, serializers.CommentReadSerializer,
+             serializers.attach_replies(list(comments))),
+            ('comment search', serializers.CommentSearchSerializer, serializers.CommentSearchReadSerializer,
+             Comment.objects.with_stats(user).order_by('created_at')),
+            ('post likes', serializers.PostLikeSerializer, serializers.PostLikeReadSerializer,
+             PostLike.objects.filter(post=self.post).select_related('author').only('id', 'post', *AUTHOR_FIELDS)),
+            ('comment likes', serializers.CommentLikeSerializer, serializers.CommentLikeReadSerializer,
+             CommentLike.objects.filter(comment=self.comment).select_related('author')
+             .only('id', 'comment', *AUTHOR_FIELDS)),
+        ]
+
+    def test_output_matches_drf(self):
+        for user in (self.viewer, AnonymousUser()):
+            for name, drf_serializer, compiled_serializer, rows in self.cases(user):
+                context = {'request': api_request(user)}
+                rows = list(rows)
+                with self.subTest(name, authenticated=user.is_authenticated):
+                    expected = JSONRenderer().render(drf_serializer(rows, many=True, context=context).data)
+                    self.assertEqual(dumps(compiled_serializer(rows, many=True, context=context).data), expected)
+                    self.assertEqual(dumps(compiled_serializer(rows[0], context=context).data),
+                                     JSONRenderer().render(drf_serializer(rows[0], context=context).data))
@@ -0,0 +1,120 @@
+"""
+Trending posts.
+
+Every post, like and comment adds weight * 2^((t - TRENDING_EPOCH) / half-life) to its post's score. Measured from a
+fixed epoch the terms never change, so a score only moves when engagement arrives and scores of different posts stay
+comparable: an old burst of likes weighs as much as a few fresh ones, exactly as an exponential decay would rank them.
+The terms grow without bound, so scores are kept as natural logarithms and added with log-add-exp.
+"""
+import math
+import sys
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, FloatField, Value
+from django.db.models.functions import Abs, Exp, Greatest, Ln, TruncHour
+from django.utils import timezone
+
+from .models import Post, PostLike, Comment, PostScore, TrendingPost
+
+TRENDING_EPOCH = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+POST_WEIGHT = 1
+LIKE_WEIGHT = 1
+COMMENT_WEIGHT = 3
+RECOMPUTE_BATCH_SIZE = 5000
+
+
+def growth_rate():
+    return math.log(2) / (getattr(settings, 'TRENDING_HALF_LIFE_HOURS', 24) * 3600)
+
+
+def engagement_term(weight, when):
+    return math.log(weight) + (when - TRENDING_EPOCH).total_seconds() * growth_rate()
+
+
+def log_add_exp(a, b):
+    return Greatest(a, b) + Ln(Value(1.0) + Exp(-Abs(a - b)), output_field=FloatField())
+
+
+def log_sub_exp(a, b):
+    # ln(e^a - e^b). A difference lost to rounding, or a score below the term after a recompute bucketed it by hour,
+    # clamps to the smallest float instead of failing in ln(); the next recompute_scores() restores exact values.
+    difference = Greatest(Value(1.0) - Exp(b - a), Value(sys.float_info.min), output_field=FloatField())
+    return a + Ln(difference, output_field=FloatField())
+
+
+def logsumexp(terms):
+    peak = max(terms)
+    return peak + math.log(sum(math.exp(term - peak) for term in terms))
+
+
+def create_post_score(post):
+    PostScore.objects.create(post=post, score=engagement_term(POST_WEIGHT, post.created_at))
+
+
+def record_engagement(post_id, weight, when):
+    # A single-row UPDATE computed by the database, so concurrent likes never overwrite each other.
+    term = Value(engagement_term(weight, when), output_field=FloatField())
+    PostScore.objects.filter(post_id=post_id).update(score=log_add_exp(F('score'), term))
+
+
+def remove_engagement(post_id, weight, whens):
+    # Takes back the terms of deleted engagement, e.g. soft-deleted comments, in one UPDATE.
+    term = Value(logsumexp([engagement_term(weight, when) for when in whens]), output_field=FloatField())
+    PostScore.objects.filter(post_id=post_id).update(score=log_sub_exp(F('score'), term))
+
+
+def recompute_scores(days=None):
+    """
+    Rebuilds the scores of recent posts from their likes and comments, which also takes back unlikes and deleted
+    comments. Engagement is counted per post and hour in the database, so a batch costs one row per active hour.
+    """
+    days = days or getattr(settings, 'TRENDING_RECOMPUTE_DAYS', 7)
+    since = timezone.now() - timedelta(days=days)
+    posts = Post.objects.filter(created_at__gte=since).order_by().values_list('id', 'created_at')
+
+    batch = []
+    for post in posts.iterator(chunk_size=RECOMPUTE_BATCH_SIZE):
+        batch.append(post)
+        if len(batch) == RECOMPUTE_BATCH_SIZE:
+            recompute_batch(batch)
+            batch = []
+    if batch:
+        recompute_batch(batch)
+
+
+def hourly_counts(queryset, post_ids):
+    return (
+        queryset.filter(post_id__in=post_ids).order_by()
+        .values_list('post_id', TruncHour('created_at')).annotate(count=Count('*'))
+    )
+
+
+def recompute_batch(posts):
+    terms = defaultdict(list)
+    for post_id, created_at in posts:
+        terms[post_id].append(engagement_term(POST_WEIGHT, created_at))
+
+    post_ids = list(terms)
+    half_hour = timedelta(minutes=30)  # bucket midpoint
+    for queryset, weight in ((PostLike.objects.all(), LIKE_WEIGHT), (Comment.objects.all(), COMMENT_WEIGHT)):
+        for post_id, hour, count in hourly_counts(queryset, post_ids):
+            terms[post_id].append(engagement_term(weight * count, hour + half_hour))
+
+    PostScore.objects.bulk_create(
+        [PostScore(post_id=post_id, score=logsumexp(post_terms)) for post_id, post_terms in terms.items()],
+        update_conflicts=True, unique_fields=['post'], update_fields=['score'],
+    )
+
+
+def refresh_trending():
+    # Reading the top K off the score index costs O(K); the snapshot gives readers stable ranks between refreshes.
+    size = getattr(settings, 'TRENDING_SIZE', 100)
+    top = PostScore.objects.order_by('-score').values_list('post_id', 'score')[:size]
+    with transaction.atomic():
+        TrendingPost.objects.all().delete()
+        TrendingPost.objects.bulk_create(
+            TrendingPost(rank=rank, post_id=post_id, score=score) for rank, (post_id, score) in enumerate(top, 1)
+        )
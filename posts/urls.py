@@ -1,11 +1,25 @@
 from django.urls import path
-from . import views
+from . import views, async_views
 
 urlpatterns = [
     path('', views.PostListCreateAPIView.as_view(), name='post-list-create'),
+    path('carousel/', views.CarouselPostCreateAPIView.as_view(), name='post-carousel-create'),
+    path('search/', views.PostSearchAPIView.as_view(), name='post-search'),
+    path('search/comments/', views.CommentSearchAPIView.as_view(), name='comment-search'),
+    path('trending/', views.TrendingPostListAPIView.as_view(), name='post-trending'),
+    path('explore/', views.ExploreAPIView.as_view(), name='post-explore'),
+    path('tags/<str:name>/', views.HashtagPostListAPIView.as_view(), name='hashtag-posts'),
+    path('mentions/', views.MentionPostListAPIView.as_view(), name='mention-posts'),
     path('<uuid:id>/', views.PostRetrieveUpdateDestroyAPIView.as_view(), name='post-detail'),
     path('<uuid:id>/comments/', views.CommentListCreateAPIView.as_view(), name='post-comments'),
     path('<uuid:post_id>/comments/<uuid:comment_id>/', views.CommentRetrieveAPIView.as_view(), name='comment-retrieve'),
     path('<uuid:post_id>/comments/<uuid:comment_id>/likes/', views.CommentLikesListCreateDestroyAPIView.as_view(), name='comment-likes'),
     path('<uuid:id>/likes/', views.PostLikeListCreateDestroyAPIView.as_view(), name='post-like'),
+
+    # Read-only variants served natively under ASGI
+    path('async/', async_views.AsyncPostListAPIView.as_view(), name='async-post-list'),
+    path('async/<uuid:id>/', async_views.AsyncPostRetrieveAPIView.as_view(), name='async-post-detail'),
+    path('async/<uuid:id>/comments/', async_views.AsyncCommentListAPIView.as_view(), name='async-post-comments'),
+    path('async/<uuid:id>/likes/', async_views.AsyncPostLikeListAPIView.as_view(), name='async-post-like'),
+    path('stream/', async_views.PostEventStreamView.as_view(), name='post-event-stream'),
 ]
\ No newline at end of file
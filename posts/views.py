@@ -1,21 +1,33 @@
-from .models import Post, Comment, PostLike, CommentLike
+from .models import Post, Comment, PostLike, CommentLike, Hashtag, PostHashtag, Mention, TrendingPost, AUTHOR_FIELDS
 from . import serializers
 from rest_framework import generics
+from rest_framework.parsers import MultiPartParser
 from rest_framework.permissions import AllowAny, IsAuthenticated, IsAuthenticatedOrReadOnly
-from shared.custom_pagination import CustomPagination
+from shared.custom_pagination import CustomPagination, CustomCursorPagination, RankedCursorPagination
+from shared.db_router import ReplicaReadMixin
+from shared.search import get_search_query, ranked_search
+from shared.serialization import CompactResponseMixin, ReadSerializerMixin
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.views import APIView
 from django.http import Http404
+from django.shortcuts import get_object_or_404
 
-from .serializers import CommentSerializer, PostLikeSerializer, CommentLikeSerializer
+from .explore import candidate_post_ids
+from .purge import soft_delete_post, soft_delete_comment
+from .serializers import CommentSerializer, PostLikeSerializer, CommentLikeSerializer, CommentSearchSerializer, \
+    HashtagSerializer, attach_replies, PostReadSerializer, CommentReadSerializer, CommentSearchReadSerializer, \
+    PostLikeReadSerializer, CommentLikeReadSerializer
 
 
-class PostListCreateAPIView(generics.ListCreateAPIView):
+class PostListCreateAPIView(ReplicaReadMixin, CompactResponseMixin, ReadSerializerMixin, generics.ListCreateAPIView):
     serializer_class = serializers.PostSerializer
-    queryset = Post.objects.all()
+    read_serializer_class = PostReadSerializer
     pagination_class = CustomPagination
 
+    def get_queryset(self):
+        return Post.objects.with_stats(self.request.user).order_by('-created_at')
+
     def get_permissions(self):
         if self.request.method == 'GET':
             return [AllowAny()]
@@ -26,12 +38,28 @@ class PostListCreateAPIView(generics.ListCreateAPIView):
         serializer.save(author=self.request.user)
 
 
-class PostRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView):
+class CarouselPostCreateAPIView(ReplicaReadMixin, generics.CreateAPIView):
+    """
+    Creates a post with several images from one multipart request: `caption` and the images, in order, as repeated
+    `images` parts. The first image is the post's cover.
+    """
+    serializer_class = serializers.CarouselPostSerializer
+    permission_classes = [IsAuthenticated]
+    parser_classes = [MultiPartParser]
+
+    def perform_create(self, serializer):
+        serializer.save(author=self.request.user)
+
+
+class PostRetrieveUpdateDestroyAPIView(ReplicaReadMixin, CompactResponseMixin, ReadSerializerMixin, generics.RetrieveUpdateDestroyAPIView):
     serializer_class = serializers.PostSerializer
+    read_serializer_class = PostReadSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
-    queryset = Post.objects.all()
     lookup_field='id'
 
+    def get_queryset(self):
+        return Post.objects.with_stats(self.request.user)
+
     def put(self, request, *args, **kwargs):
         post = self.get_object()
         serializer = self.serializer_class(instance=post, data=request.data)
@@ -49,7 +77,7 @@ class PostRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView):
 
     def delete(self, request, *args, **kwargs):
         post = self.get_object()
-        post.delete()
+        soft_delete_post(post)
         return Response(
             {
                 "success": True,
@@ -59,54 +87,85 @@ class PostRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView):
         )
 
 
-class CommentListCreateAPIView(generics.ListCreateAPIView):
+class CommentListCreateAPIView(ReplicaReadMixin, CompactResponseMixin, ReadSerializerMixin, generics.ListCreateAPIView):
     serializer_class = CommentSerializer
+    read_serializer_class = CommentReadSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
 
     def get_queryset(self):
         # print(self.kwargs)  # {'id': UUID('bf219fcf-7177-49fd-a2f4-e3df8b765189')}
         post_id = self.kwargs['id']
-        queryset = Comment.objects.filter(post__id=post_id)
+        queryset = Comment.objects.with_stats(self.request.user).filter(post__id=post_id, post__deleted_at=None).order_by('created_at')
         return queryset
 
+    def list(self, request, *args, **kwargs):
+        comments = attach_replies(list(self.get_queryset()))
+        serializer = self.get_serializer(comments, many=True)
+        return Response(serializer.data)
+
     def perform_create(self, serializer):
-        post_id = self.kwargs.get('id')
-        serializer.save(author=self.request.user, post_id=post_id)
+        post = get_object_or_404(Post.objects.only('id'), id=self.kwargs.get('id'))  # not on a deleted post
+        serializer.save(author=self.request.user, post_id=post.id)
 
 
-class CommentRetrieveAPIView(APIView):
-    permission_classes = [AllowAny]
+class CommentRetrieveAPIView(ReplicaReadMixin, APIView):
+    permission_classes = [IsAuthenticatedOrReadOnly]
 
     def get(self, request, *args, **kwargs):
         post_id = kwargs['post_id']
         comment_id = kwargs['comment_id']
         try:
-            comment = Comment.objects.get(post_id=post_id, id=comment_id)
+            comment = Comment.objects.with_stats(request.user).get(post_id=post_id, id=comment_id, post__deleted_at=None)
         except Comment.DoesNotExist:
             raise Http404("Comment with this id does not exist.")
         
         serializer = CommentSerializer(comment, context={'request': request})
         return Response(serializer.data, status=200)
 
+    def delete(self, request, *args, **kwargs):
+        try:
+            comment = Comment.objects.select_related('post').get(
+                post_id=kwargs['post_id'], id=kwargs['comment_id'], post__deleted_at=None,
+            )
+        except Comment.DoesNotExist:
+            raise Http404("Comment with this id does not exist.")
 
-class PostLikeListCreateDestroyAPIView(generics.ListCreateAPIView, generics.DestroyAPIView):
+        if request.user.id not in (comment.author_id, comment.post.author_id):
+            return Response(
+                {
+                    'success': False,
+                    'message': "You can only delete your own comments or comments on your posts."
+                }, status=status.HTTP_403_FORBIDDEN
+            )
+
+        soft_delete_comment(comment)
+        return Response(
+            {
+                'success': True,
+                'message': "Comment successfully deleted."
+            }, status=status.HTTP_204_NO_CONTENT
+        )
+
+
+class PostLikeListCreateDestroyAPIView(ReplicaReadMixin, CompactResponseMixin, ReadSerializerMixin, generics.ListCreateAPIView, generics.DestroyAPIView):
     serializer_class = PostLikeSerializer
+    read_serializer_class = PostLikeReadSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
 
     def get_queryset(self):
         post_id = self.kwargs.get('id')
-        return PostLike.objects.filter(post_id=post_id)
+        return PostLike.objects.filter(post_id=post_id, post__deleted_at=None).select_related('author').only('id', 'post', *AUTHOR_FIELDS).order_by('created_at')
 
     def post(self, request, *args, **kwargs):
         post_id = kwargs['id']
+        if not Post.objects.filter(id=post_id).exists():  # deleted posts take no likes
+            raise Http404("Post with this id does not exist.")
 
         try:
             post = PostLike.objects.create(
                 author=request.user,
                 post_id=post_id
             )
-        except Post.DoesNotExist:
-            raise Http404("Post with this id does not exist.")
         except Exception as e:
             return Response(
                 {
@@ -140,24 +199,26 @@ class PostLikeListCreateDestroyAPIView(generics.ListCreateAPIView, generics.Dest
             status=status.HTTP_204_NO_CONTENT)
 
 
-class CommentLikesListCreateDestroyAPIView(APIView):
+class CommentLikesListCreateDestroyAPIView(ReplicaReadMixin, CompactResponseMixin, APIView):
     permission_classes = [IsAuthenticatedOrReadOnly]
 
     def get(self, request, *args, **kwargs):
         post_id = kwargs['post_id']
         comment_id = kwargs['comment_id']
         try:
-            comment = Comment.objects.get(post_id=post_id, id=comment_id)
-            comment_likes = CommentLike.objects.filter(comment=comment)
+            comment = Comment.objects.only('id').get(post_id=post_id, id=comment_id, post__deleted_at=None)
+            comment_likes = CommentLike.objects.filter(comment=comment).select_related('author').only('id', 'comment', *AUTHOR_FIELDS)
         except Comment.DoesNotExist:
             raise Http404("Comment with this id does not exist.")
         
-        serializer = CommentLikeSerializer(comment_likes, many=True)
+        serializer = CommentLikeReadSerializer(comment_likes, many=True)
         return Response(serializer.data, status=200)
     
     def post(self, request, *args, **kwargs):
         post_id = kwargs['post_id']
         comment_id = kwargs['comment_id']
+        if not Comment.objects.filter(post_id=post_id, id=comment_id, post__deleted_at=None).exists():
+            raise Http404("Comment with this id does not exist.")
 
         try:
             comment_like = CommentLike.objects.create(
@@ -198,3 +259,91 @@ class CommentLikesListCreateDestroyAPIView(APIView):
             }, status=status.HTTP_204_NO_CONTENT
         )
 
+
+class PostSearchAPIView(ReplicaReadMixin, CompactResponseMixin, ReadSerializerMixin, generics.ListAPIView):
+    serializer_class = serializers.PostSerializer
+    read_serializer_class = PostReadSerializer
+    permission_classes = [AllowAny]
+    pagination_class = RankedCursorPagination
+
+    def get_queryset(self):
+        query = get_search_query(self.request)
+        return ranked_search(Post.objects.with_stats(self.request.user), 'caption', query)
+
+
+class CommentSearchAPIView(ReplicaReadMixin, CompactResponseMixin, ReadSerializerMixin, generics.ListAPIView):
+    serializer_class = CommentSearchSerializer
+    read_serializer_class = CommentSearchReadSerializer
+    permission_classes = [AllowAny]
+    pagination_class = RankedCursorPagination
+
+    def get_queryset(self):
+        query = get_search_query(self.request)
+        return ranked_search(Comment.objects.with_stats(self.request.user), 'comment_text', query)
+
+
+class LinkedPostListAPIView(ReplicaReadMixin, CompactResponseMixin, ReadSerializerMixin, generics.ListAPIView):
+    """
+    Lists posts through an index table (PostHashtag, Mention) ordered by the link's created_at.
+    The links are paginated by keyset on their own index, then the page of posts is loaded with its stats in one query.
+    """
+    serializer_class = serializers.PostSerializer
+    read_serializer_class = PostReadSerializer
+    pagination_class = CustomCursorPagination
+
+    def list(self, request, *args, **kwargs):
+        ordering = self.pagination_class.ordering.lstrip('-')
+        links = self.paginate_queryset(self.get_queryset().only('pk', 'post_id', ordering))
+        posts = Post.objects.with_stats(request.user).in_bulk([link.post_id for link in links])
+        page = [posts[link.post_id] for link in links if link.post_id in posts]
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+
+class HashtagPostListAPIView(LinkedPostListAPIView):
+    permission_classes = [AllowAny]
+
+    def get_queryset(self):
+        self.hashtag = get_object_or_404(Hashtag, name=self.kwargs['name'].lower())
+        return PostHashtag.objects.filter(hashtag=self.hashtag)
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        response.data['hashtag'] = HashtagSerializer(self.hashtag).data
+        return response
+
+
+class MentionPostListAPIView(LinkedPostListAPIView):
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return Mention.objects.filter(user=self.request.user)
+
+
+class TrendingPagination(CustomCursorPagination):
+    ordering = 'rank'
+
+
+class TrendingPostListAPIView(LinkedPostListAPIView):
+    permission_classes = [AllowAny]
+    pagination_class = TrendingPagination
+
+    def get_queryset(self):
+        return TrendingPost.objects.all()
+
+
+class ExploreAPIView(ReplicaReadMixin, CompactResponseMixin, ReadSerializerMixin, generics.ListAPIView):
+    serializer_class = serializers.PostSerializer
+    read_serializer_class = PostReadSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = CustomPagination
+
+    def list(self, request, *args, **kwargs):
+        # Users without candidates yet (no likes, or the job has not run) get the trending posts.
+        post_ids = candidate_post_ids(request.user) or list(
+            TrendingPost.objects.order_by('rank').values_list('post_id', flat=True)
+        )
+        page = self.paginate_queryset(post_ids)
+        posts = Post.objects.with_stats(request.user).in_bulk(page)
+        serializer = self.get_serializer([posts[post_id] for post_id in page if post_id in posts], many=True)
+        return self.get_paginated_response(serializer.data)
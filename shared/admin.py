@@ -1,3 +1,125 @@
+"""
+Admin changelists for tables too large to count or page through with OFFSET.
+
+- EstimatedCountPaginator takes the row count of an unfiltered table from the planner statistics (pg_class.reltuples)
+  and stops counting filtered results at ADMIN_COUNT_LIMIT.
+- KeysetChangeList orders by primary key and addresses the pages after the first by the last key shown
+  (?after=<pk>), so every page is an index range scan however deep it is.
+- LargeTableAdmin combines them and only searches indexed columns: ids, usernames and the full-text search vector.
+"""
+import uuid
+from math import ceil
+
+from django.conf import settings
 from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import PAGE_VAR, ChangeList
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+from users.models import CustomUser
+from .search import ranked_search
+
+CURSOR_VAR = 'after'
+
+
+def estimated_row_count(model, using):
+    # reltuples of a partitioned table is the sum over its partitions; it is -1 before the first ANALYZE.
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            'SELECT SUM(GREATEST(reltuples, 0)) FROM pg_class WHERE oid = %s::regclass '
+            'OR oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = %s::regclass)',
+            [model._meta.db_table] * 2,
+        )
+        return int(cursor.fetchone()[0] or 0)
+
+
+def count_limit():
+    return getattr(settings, 'ADMIN_COUNT_LIMIT', 10000)
+
+
+class EstimatedCountPaginator(Paginator):
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if connections[queryset.db].vendor == 'postgresql' and not queryset.query.where:
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate > count_limit():
+                return estimate
+        # Small tables and filtered results: exact up to the limit, SELECT COUNT(*) FROM (... LIMIT n).
+        return queryset[:count_limit() + 1].count()
+
+    @cached_property
+    def num_pages(self):
+        # Numbered pages (OFFSET) stop at the limit; KeysetChangeList links to the rows beyond it.
+        hits = max(1, min(self.count, count_limit()) - self.orphans)
+        return ceil(hits / self.per_page)
+
+
+class KeysetChangeList(ChangeList):
+    def __init__(self, request, *args, **kwargs):
+        self.cursor = request.GET.get(CURSOR_VAR)
+        super().__init__(request, *args, **kwargs)
+
+    def get_filters_params(self, params=None):
+        params = super().get_filters_params(params)
+        params.pop(CURSOR_VAR, None)
+        return params
+
+    def get_queryset(self, request, exclude_parameters=None):
+        queryset = super().get_queryset(request, exclude_parameters)
+        if self.cursor is None:
+            return queryset
+        try:
+            return queryset.filter(pk__lt=self.model._meta.pk.to_python(self.cursor))
+        except ValidationError as error:
+            raise IncorrectLookupParameters(error)
+
+    def get_results(self, request):
+        super().get_results(request)
+        self.next_page_url = None
+        shown = len(self.result_list)  # evaluates the page once; indexing then reads the result cache
+        if shown == self.list_per_page:
+            self.next_page_url = self.get_query_string({CURSOR_VAR: self.result_list[shown - 1].pk}, [PAGE_VAR])
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    ModelAdmin for tables with millions of rows. Searching takes an id, a @username or, with search_text_field, words
+    matched through the search vector's GIN index.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    ordering = ['-pk']  # UUIDv7 keys: newest first
+    sortable_by = []  # any other order would need a sort over the whole table
+    change_list_template = 'admin/keyset_change_list.html'
+    search_id_fields = ['pk']
+    search_user_field = None
+    search_text_field = None
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        try:
+            value = uuid.UUID(term)
+        except ValueError:
+            pass
+        else:
+            condition = Q()
+            for field in self.search_id_fields:
+                condition |= Q(**{field: value})
+            return queryset.filter(condition), False
 
-# Register your models here.
+        if self.search_user_field and (term.startswith('@') or not self.search_text_field):
+            users = CustomUser.objects.by_username(term.lstrip('@')).values('pk')
+            return queryset.filter(**{f'{self.search_user_field}__in': users}), False
+        if self.search_text_field:
+            return ranked_search(queryset, self.search_text_field, term), False
+        return queryset.none(), False
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class SharedConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'shared'
+
+    def ready(self):
+        from .db_router import check_sticky_cache
+        from .task_metrics import check_metrics_cache
+        check_sticky_cache()
+        check_metrics_cache()
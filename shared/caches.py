@@ -0,0 +1,22 @@
+"""
+Caches that several processes write and read: the replica sticky window (shared/db_router.py) and the Celery task
+counters (shared/task_metrics.py). SharedConfig.ready() checks them, so a misconfigured process fails at startup.
+"""
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+# Caches that live in one process (or store nothing): what a worker writes there no other process sees.
+PER_PROCESS_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def require_shared_cache(setting, default, condition):
+    alias = getattr(settings, setting, default)
+    backend = settings.CACHES.get(alias, {}).get('BACKEND')
+    if backend is None or backend in PER_PROCESS_CACHES:
+        raise ImproperlyConfigured(
+            f'{condition}, {setting} ({alias!r}) must be a cache shared by all processes, e.g. Redis; '
+            f'{backend or "no cache"} is not.'
+        )
@@ -1,4 +1,13 @@
-from rest_framework.pagination import PageNumberPagination
+import asyncio
+import base64
+import uuid
+
+from django.core.paginator import InvalidPage, Page
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.utils.urls import replace_query_param
+from rest_framework.request import Request
 from rest_framework.response import Response
 
 
@@ -7,6 +16,62 @@ class CustomPagination(PageNumberPagination):
     page_size_query_param = 'page_size'  # http://localhost:8000/posts/?page_size=100
     max_page_size = 100  #  http://localhost:8000/posts/?page_size=100. This amount cannot be greater than 100
 
+    def get_paginated_data(self, data):
+        return {
+            'links': {
+                'previous': self.get_previous_link(),
+                'next': self.get_next_link(),
+            },
+            'count': self.page.paginator.count,
+            'result': data
+        }
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    async def apaginate_queryset(self, queryset, request):
+        # Async counterpart of paginate_queryset(): the page and the total count are fetched concurrently.
+        # Raises NotFound like it, for the async views to render.
+        page_size = self.get_page_size(Request(request))  # get_page_size() reads DRF's request.query_params
+        paginator = self.django_paginator_class(queryset, page_size)
+        page_number = request.GET.get(self.page_query_param) or 1
+        if page_number in self.last_page_strings:
+            paginator.count = await queryset.acount()
+            number = paginator.num_pages
+        else:
+            try:
+                number = int(page_number)
+            except ValueError:
+                number = 0
+        if number < 1:
+            raise NotFound(self.invalid_page_message)
+
+        bottom = (number - 1) * page_size
+
+        async def fetch_page():
+            return [obj async for obj in queryset[bottom:bottom + page_size]]
+
+        if page_number in self.last_page_strings:
+            object_list = await fetch_page()
+        else:
+            paginator.count, object_list = await asyncio.gather(queryset.acount(), fetch_page())
+        try:
+            number = paginator.validate_number(number)
+        except InvalidPage:
+            raise NotFound(self.invalid_page_message)
+
+        self.page = Page(object_list, number, paginator)
+        self.request = request
+        return object_list
+
+
+class CustomCursorPagination(CursorPagination):
+    # Keyset pagination: the cost of a page does not grow with its depth, and there is no COUNT(*).
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = '-created_at'
+
     def get_paginated_response(self, data):
         return Response(
             {
@@ -14,7 +79,43 @@ class CustomPagination(PageNumberPagination):
                     'previous': self.get_previous_link(),
                     'next': self.get_next_link(),
                 },
-                'count': self.page.paginator.count,
                 'result': data
             }
-        )    
+        )
+
+
+class RankedCursorPagination(CustomCursorPagination):
+    """
+    Keyset pagination over a `rank` annotation (higher first), ties broken by primary key.
+    Only forward navigation is supported; the cursor encodes the rank and id of the last row of the page.
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded:
+            rank, pk = self.decode_position(encoded)
+            queryset = queryset.filter(Q(rank__lt=rank) | Q(rank=rank, pk__lt=pk))
+
+        results = list(queryset.order_by('-rank', '-pk')[:self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        return self.page
+
+    def decode_position(self, encoded):
+        try:
+            rank, pk = base64.urlsafe_b64decode(encoded.encode('ascii')).decode('ascii').split(':', 1)
+            return float(rank), uuid.UUID(pk)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        position = base64.urlsafe_b64encode(f'{last.rank!r}:{last.pk}'.encode('ascii')).decode('ascii')
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, position)
+
+    def get_previous_link(self):
+        return None
@@ -0,0 +1,106 @@
+"""
+Primary/replica routing.
+
+Everything goes to the primary ('default') unless a view opts in with ReplicaReadMixin: its safe-method requests
+read from a healthy replica, except for users who wrote within the last REPLICA_STICKY_SECONDS, whose reads stay on
+the primary so they see their own likes and comments despite replication lag. Those writes are recorded in the
+REPLICA_STICKY_CACHE, which every worker must share: check_sticky_cache() stops the startup otherwise.
+"""
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from rest_framework.permissions import SAFE_METHODS
+
+from .caches import require_shared_cache
+
+_read_from_replica = ContextVar('read_from_replica', default=False)
+_next_check = {}  # alias -> monotonic time of its next health check
+_healthy = {}
+
+
+def replica_aliases():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+def is_healthy(alias):
+    # Checked at most once per REPLICA_HEALTH_CHECK_INTERVAL per process; a failed replica is retried after that.
+    now = time.monotonic()
+    if now >= _next_check.get(alias, 0):
+        _next_check[alias] = now + getattr(settings, 'REPLICA_HEALTH_CHECK_INTERVAL', 10)
+        try:
+            with connections[alias].cursor() as cursor:
+                cursor.execute('SELECT 1')
+            _healthy[alias] = True
+        except DatabaseError:
+            connections[alias].close()
+            _healthy[alias] = False
+    return _healthy[alias]
+
+
+def sticky_cache_alias():
+    return getattr(settings, 'REPLICA_STICKY_CACHE', 'default')
+
+
+def check_sticky_cache():
+    # Without replicas every read goes to the primary and any cache will do.
+    if replica_aliases():
+        require_shared_cache('REPLICA_STICKY_CACHE', 'default', 'With DATABASE_REPLICAS')
+
+
+def _sticky_key(user_id):
+    return f'db-router:wrote:{user_id}'
+
+
+def record_write(user):
+    if user.is_authenticated:
+        caches[sticky_cache_alias()].set(_sticky_key(user.pk), True, getattr(settings, 'REPLICA_STICKY_SECONDS', 5))
+
+
+def wrote_recently(user):
+    return user.is_authenticated and caches[sticky_cache_alias()].get(_sticky_key(user.pk), False)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        # Reads inside a transaction must see its writes.
+        if not _read_from_replica.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        replicas = [alias for alias in replica_aliases() if is_healthy(alias)]
+        return random.choice(replicas) if replicas else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary.
+        if {obj1._state.db, obj2._state.db} <= {DEFAULT_DB_ALIAS, *replica_aliases()}:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaReadMixin:
+    """
+    DRF view mixin: GET/HEAD/OPTIONS read from a replica unless the user wrote recently; successful writes start
+    the user's sticky window.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS and not wrote_recently(request.user):
+            self._replica_token = _read_from_replica.set(True)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, '_replica_token', None)
+        if token is not None:
+            _read_from_replica.reset(token)
+            self._replica_token = None
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            record_write(request.user)
+        return super().finalize_response(request, response, *args, **kwargs)
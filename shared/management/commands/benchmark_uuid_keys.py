@@ -0,0 +1,61 @@
+import time
+import uuid
+from timeit import timeit
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from shared.models import uuid7
+
+KEY_FUNCTIONS = {'uuid4': uuid.uuid4, 'uuid7': uuid7}
+
+
+class Command(BaseCommand):
+    help = (
+        'Compares random (v4) and time-ordered (v7) primary keys: the cost of generating one, and COPY throughput, '
+        'WAL volume and primary key index size when inserting into a scratch table with a uuid primary key and one '
+        'secondary index. PostgreSQL only.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=3_000_000)
+        parser.add_argument('--batch-size', type=int, default=20_000, help='Rows copied per transaction.')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('COPY, WAL positions and relation sizes are read from PostgreSQL.')
+
+        for name, make in KEY_FUNCTIONS.items():
+            cost = timeit(make, number=100_000) / 100_000
+            self.stdout.write(f'generate {name}: {cost * 1e6:.2f} us')
+
+        with connection.cursor() as cursor:
+            for name, make in KEY_FUNCTIONS.items():
+                cursor.execute('CREATE TABLE bench_keys (id uuid PRIMARY KEY, post_id uuid NOT NULL, '
+                               'created_at timestamptz NOT NULL DEFAULT now())')
+                try:
+                    cursor.execute('CREATE INDEX ON bench_keys (post_id)')
+                    cursor.execute('CHECKPOINT')  # full-page writes start over for both runs
+                    cursor.execute('SELECT pg_current_wal_lsn()')
+                    start_lsn = cursor.fetchone()[0]
+                    rate = self.copy(cursor, make, options['rows'], options['batch_size'])
+                    cursor.execute('SELECT pg_wal_lsn_diff(pg_current_wal_lsn(), %s), '
+                                   "pg_relation_size('bench_keys_pkey')", [start_lsn])
+                    wal, index_size = cursor.fetchone()
+                finally:
+                    cursor.execute('DROP TABLE bench_keys')
+                self.stdout.write(f'insert {name}: {rate:,.0f} rows/s, WAL {wal / 2 ** 20:,.0f} MiB, '
+                                  f'primary key index {index_size / 2 ** 20:,.0f} MiB')
+
+    @staticmethod
+    def copy(cursor, make, rows, batch_size):
+        elapsed = 0.0
+        for batch in range(0, rows, batch_size):
+            # 1000 posts, so the secondary index grows the same way in both runs.
+            values = [(make(), uuid.UUID(int=row % 1000)) for row in range(batch, min(batch + batch_size, rows))]
+            start = time.perf_counter()
+            with transaction.atomic(), cursor.copy('COPY bench_keys (id, post_id) FROM STDIN') as copy:
+                for row in values:
+                    copy.write_row(row)
+            elapsed += time.perf_counter() - start
+        return rows / elapsed
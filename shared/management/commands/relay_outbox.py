@@ -0,0 +1,33 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from kombu.exceptions import OperationalError
+
+from instagram_clone.celery import app
+from shared.outbox import relay
+
+
+class Command(BaseCommand):
+    help = 'Publishes the tasks queued in the outbox to Celery, batch by batch, until stopped.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.OUTBOX_BATCH_SIZE)
+        parser.add_argument('--once', action='store_true', help='Exit once the outbox is empty.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        while True:
+            try:
+                sent = relay(app, batch_size)
+            except OperationalError as error:
+                # The batch stays in the outbox and is retried.
+                self.stderr.write(f'Broker unavailable: {error}')
+                sent = 0
+            else:
+                if sent:
+                    self.stdout.write(f'Published {sent} tasks.')
+                if sent < batch_size and options['once']:
+                    return
+            if sent < batch_size:
+                time.sleep(settings.OUTBOX_POLL_INTERVAL)
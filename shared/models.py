@@ -1,9 +1,38 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.db.models.fields.files import FieldFile
+import secrets
+import threading
+import time
 import uuid
 
+_uuid7_lock = threading.Lock()
+_uuid7_last = [0, 0]  # milliseconds, counter
+
+
+def uuid7(timestamp=None):
+    """
+    Time-ordered UUID (RFC 9562 version 7): 48 bits of Unix milliseconds, a 12-bit counter and 62 random bits.
+    Ids made by one process increase even within a millisecond, so inserts land at the right edge of the index.
+    `timestamp` (a datetime) backdates the id, e.g. for seeded rows; those ids are not guaranteed monotonic.
+    """
+    if timestamp is not None:
+        milliseconds, counter = int(timestamp.timestamp() * 1000), secrets.randbits(12)
+    else:
+        milliseconds = time.time_ns() // 1_000_000
+        with _uuid7_lock:
+            if milliseconds > _uuid7_last[0]:
+                _uuid7_last[:] = [milliseconds, 0]
+            elif _uuid7_last[1] < 0xFFF:
+                _uuid7_last[1] += 1
+            else:  # counter exhausted: borrow the next millisecond
+                _uuid7_last[:] = [_uuid7_last[0] + 1, 0]
+            milliseconds, counter = _uuid7_last
+    return uuid.UUID(int=milliseconds << 80 | 0x7 << 76 | counter << 64 | 0b10 << 62 | secrets.randbits(62))
+
 
 class BaseModel(models.Model):
-    id = models.UUIDField(primary_key=True, unique=True, default=uuid.uuid4, editable=False)
+    id = models.UUIDField(primary_key=True, unique=True, default=uuid7, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -11,3 +40,82 @@ class BaseModel(models.Model):
     class Meta:
         abstract = True  # It means this model is aimed for inheritance and will not be saved in database.
 
+
+class DirtyFieldsMixin:
+    """
+    Remembers the values an instance was loaded with, so that save() only writes the columns that changed.
+    Instances that were not loaded from the database are saved as usual.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = {
+            attname: instance._comparable_value(value) for attname, value in zip(field_names, values)
+        }
+        return instance
+
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        if hasattr(self, '_loaded_values'):
+            self._loaded_values.update(self._current_values(fields))
+
+
+    @staticmethod
+    def _comparable_value(value):
+        if isinstance(value, FieldFile):
+            return value.name
+        return value
+
+
+    def _current_values(self, fields=None):
+        deferred = self.get_deferred_fields()
+        values = {}
+        for field in self._meta.concrete_fields:
+            if field.attname in deferred or (fields is not None and field.name not in fields and field.attname not in fields):
+                continue
+            values[field.attname] = self._comparable_value(getattr(self, field.attname))
+        return values
+
+
+    def get_dirty_fields(self):
+        """Names of the concrete fields changed since loading, or None when the loaded state is unknown."""
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None:
+            return None
+
+        return [
+            field.name for field in self._meta.concrete_fields
+            if not field.primary_key
+            and field.attname in self.__dict__
+            and (field.attname not in loaded or self._comparable_value(getattr(self, field.attname)) != loaded[field.attname])
+        ]
+
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and not args and kwargs.get('update_fields') is None:
+            dirty_fields = self.get_dirty_fields()
+            # Nothing changed: a regular save, since update_fields=[] would skip the write and the signals.
+            if dirty_fields:
+                kwargs['update_fields'] = dirty_fields + [
+                    field.name for field in self._meta.concrete_fields
+                    if getattr(field, 'auto_now', False) and field.name not in dirty_fields
+                ]
+
+        super().save(*args, **kwargs)
+        self._loaded_values = self._current_values()
+
+
+class SoftDeleteManager(models.Manager):
+    """Hides soft-deleted rows (deleted_at set); models keep an unfiltered `all_objects` manager next to it."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at=None)
+
+
+class OutboxMessage(BaseModel):
+    """A Celery task waiting to be published by `manage.py relay_outbox`, see shared/outbox.py."""
+    task = models.CharField(max_length=255)
+    args = models.JSONField(default=list, encoder=DjangoJSONEncoder)
+    kwargs = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
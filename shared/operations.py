@@ -0,0 +1,200 @@
+from itertools import count
+
+from django.conf import settings
+from django.db import transaction
+from django.db.migrations.operations.base import Operation
+from django.db.models import UniqueConstraint
+
+
+class PostgreSQLOnly(Operation):
+    """
+    Applies the schema change of the wrapped operation on PostgreSQL only (GIN indexes, partitioning, ...).
+    The migration state is left unchanged, like the database of other backends: SQLite re-creates every index of
+    the state whenever it rebuilds a table, so a PostgreSQL-only index there would break later migrations.
+    The wrapped index must therefore not be declared in the model's Meta.indexes either.
+    """
+
+    def __init__(self, operation):
+        self.operation = operation
+
+    def deconstruct(self):
+        return self.__class__.__name__, [self.operation], {}
+
+    @property
+    def reversible(self):
+        return self.operation.reversible
+
+    def state_forwards(self, app_label, state):
+        pass
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            self.operation.database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            self.operation.database_backwards(app_label, schema_editor, from_state, to_state)
+
+    def describe(self):
+        return f'{self.operation.describe()} (PostgreSQL only)'
+
+    @property
+    def migration_name_fragment(self):
+        return self.operation.migration_name_fragment
+
+
+class HashPartition(Operation):
+    """
+    Rebuilds a model's table on PostgreSQL as PARTITION BY HASH (field) with `partitions` partitions, so lookups
+    filtered on the field touch one partition. The primary key becomes (id, field), since PostgreSQL requires
+    partition keys in every unique constraint; lookups by id alone probe each partition's primary key index.
+
+    The table stays writable while its rows are copied, so the migration must set atomic = False:
+    1. the new table is created with its keys, indexes and constraints, and a trigger mirrors every write to the
+       old table into it;
+    2. rows are copied in primary key order, PARTITION_COPY_BATCH_SIZE per transaction, each batch locking only
+       its own rows against concurrent updates and deletes;
+    3. the old table is dropped and the new one takes its name, under a lock held for the length of a few
+       catalog updates.
+    Until then the table takes twice its disk space. If the copy fails, the new table is dropped again.
+    Other backends and the migration state are left unchanged.
+    """
+    reversible = True
+
+    def __init__(self, model_name, field_name, partitions):
+        self.model_name = model_name
+        self.field_name = field_name
+        self.partitions = partitions
+
+    def deconstruct(self):
+        return self.__class__.__name__, [self.model_name, self.field_name, self.partitions], {}
+
+    def state_forwards(self, app_label, state):
+        pass
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            model = to_state.apps.get_model(app_label, self.model_name)
+            key = model._meta.get_field(self.field_name).column
+            self.rebuild(schema_editor, model, f'PARTITION BY HASH ({schema_editor.quote_name(key)})', [model._meta.pk.column, key])
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            model = to_state.apps.get_model(app_label, self.model_name)
+            self.rebuild(schema_editor, model, '', [model._meta.pk.column], partitioned=False)
+
+    def rebuild(self, schema_editor, model, partition_by, primary_key, partitioned=True):
+        connection = schema_editor.connection
+        if connection.in_atomic_block and not schema_editor.collect_sql:
+            raise ValueError('HashPartition copies rows in batches that commit one by one: set atomic = False on the '
+                             'migration.')
+        quote = schema_editor.quote_name
+        table = model._meta.db_table
+        new_table = f'{table}__new'
+        mirror = quote(f'{table}__mirror')
+
+        with transaction.atomic(using=connection.alias):
+            schema_editor.execute(
+                f'CREATE TABLE {quote(new_table)} (LIKE {quote(table)} INCLUDING DEFAULTS) {partition_by}'
+            )
+            if partitioned:
+                for remainder in range(self.partitions):
+                    schema_editor.execute(
+                        f'CREATE TABLE {quote(f"{table}_p{remainder}")} PARTITION OF {quote(new_table)} '
+                        f'FOR VALUES WITH (MODULUS {self.partitions}, REMAINDER {remainder})'
+                    )
+            renames = self.create_keys(schema_editor, model, new_table, primary_key)
+
+            key_columns = ', '.join(map(quote, primary_key))
+            old_key = ', '.join(f'OLD.{quote(column)}' for column in primary_key)
+            schema_editor.execute(
+                f'CREATE FUNCTION {mirror}() RETURNS trigger LANGUAGE plpgsql AS $$ BEGIN '
+                f"IF TG_OP <> 'INSERT' THEN "
+                f'DELETE FROM {quote(new_table)} WHERE ({key_columns}) = ({old_key}); END IF; '
+                f"IF TG_OP <> 'DELETE' THEN "
+                f'INSERT INTO {quote(new_table)} SELECT (NEW).* ON CONFLICT DO NOTHING; END IF; '
+                f'RETURN NULL; END $$'
+            )
+            # Waits for the transactions writing to the table: every later write is mirrored, every earlier one is
+            # visible to the copy.
+            schema_editor.execute(
+                f'CREATE TRIGGER {mirror} AFTER INSERT OR UPDATE OR DELETE ON {quote(table)} '
+                f'FOR EACH ROW EXECUTE FUNCTION {mirror}()'
+            )
+
+        try:
+            self.copy_rows(schema_editor, table, new_table, quote(model._meta.pk.column))
+        except BaseException:
+            with transaction.atomic(using=connection.alias):
+                schema_editor.execute(f'DROP TRIGGER {mirror} ON {quote(table)}')
+                schema_editor.execute(f'DROP FUNCTION {mirror}()')
+                schema_editor.execute(f'DROP TABLE {quote(new_table)}')
+            raise
+
+        with transaction.atomic(using=connection.alias):
+            schema_editor.execute(f'LOCK TABLE {quote(table)} IN ACCESS EXCLUSIVE MODE')
+            schema_editor.execute(f'DROP TABLE {quote(table)}')  # and its trigger
+            schema_editor.execute(f'DROP FUNCTION {mirror}()')
+            schema_editor.execute(f'ALTER TABLE {quote(new_table)} RENAME TO {quote(table)}')
+            for sql in renames:
+                schema_editor.execute(sql)
+
+    def create_keys(self, schema_editor, model, new_table, primary_key):
+        # Index names (unique constraints and the primary key included) are unique per schema, not per table: the new
+        # table's indexes take temporary names while the old table exists. Returns the statements that rename them.
+        quote = schema_editor.quote_name
+        table = model._meta.db_table
+        temporary = iter(quote(f'{new_table}_{number}') for number in count())
+        renames = []
+
+        name = next(temporary)
+        schema_editor.execute(f'ALTER TABLE {quote(new_table)} ADD CONSTRAINT {name} PRIMARY KEY '
+                              f'({", ".join(map(quote, primary_key))})')
+        renames.append(f'ALTER INDEX {name} RENAME TO {quote(f"{table}_pkey")}')
+
+        statements = [
+            schema_editor._create_fk_sql(model, field, '_fk_%(to_table)s_%(to_column)s')
+            for field in model._meta.local_fields if field.remote_field and field.db_constraint
+        ]
+        indexed = [*schema_editor._model_indexes_sql(model), *(
+            constraint.create_sql(model, schema_editor) for constraint in model._meta.constraints
+            if isinstance(constraint, UniqueConstraint)
+        )]
+        statements += [constraint.create_sql(model, schema_editor) for constraint in model._meta.constraints
+                       if not isinstance(constraint, UniqueConstraint)]
+        for statement in indexed:
+            name = next(temporary)
+            renames.append(f'ALTER INDEX {name} RENAME TO {statement.parts["name"]}')
+            statement.parts['name'] = name
+        for statement in statements + indexed:
+            statement.parts['table'].rename_table_references(table, new_table)
+            schema_editor.execute(statement)
+        return renames
+
+    def copy_rows(self, schema_editor, table, new_table, pk):
+        quote = schema_editor.quote_name
+        batch_size = getattr(settings, 'PARTITION_COPY_BATCH_SIZE', 10000)
+        last = None
+        while True:
+            after, params = ('', []) if last is None else (f' WHERE {pk} > %s', [last])
+            sql = (
+                f'WITH batch AS (SELECT * FROM {quote(table)}{after} ORDER BY {pk} LIMIT {batch_size} FOR SHARE), '
+                f'copied AS (INSERT INTO {quote(new_table)} SELECT * FROM batch ON CONFLICT DO NOTHING) '
+                f'SELECT {pk} FROM batch ORDER BY {pk} DESC LIMIT 1'
+            )
+            if schema_editor.collect_sql:  # sqlmigrate: show the first batch
+                schema_editor.execute(sql, params)
+                return
+            with schema_editor.connection.cursor() as cursor:
+                cursor.execute(sql, params)
+                row = cursor.fetchone()
+            if row is None:
+                return
+            last = row[0]
+
+    def describe(self):
+        return f'Hash-partition {self.model_name} by {self.field_name} into {self.partitions} partitions (PostgreSQL only)'
+
+    @property
+    def migration_name_fragment(self):
+        return f'partition_{self.model_name.lower()}'
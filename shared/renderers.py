@@ -0,0 +1,31 @@
+import orjson
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+_encoder = JSONEncoder()
+_renderer = JSONRenderer()
+
+
+def dumps(data):
+    """
+    Same bytes as DRF's JSONRenderer with COMPACT_JSON and UNICODE_JSON, several times faster.
+    Datetimes are passed through so they keep DRF's format ('Z' suffix); other types orjson does not know
+    go to DRF's encoder. Non-string keys, e.g. the indexes in ListField errors, become strings as with json.dumps().
+    What orjson refuses, ints wider than 64 bits or nesting deeper than 254 levels, is rendered by JSONRenderer.
+    """
+    try:
+        output = orjson.dumps(data, default=_encoder.default, option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS)
+    except TypeError:  # orjson.JSONEncodeError
+        return _renderer.render(data)
+    if b'\xe2\x80' in output:  # JSONRenderer escapes U+2028 and U+2029
+        output = output.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
+    return output
+
+
+class ORJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)  # pretty printing, e.g. browsable API
+        return dumps(data)
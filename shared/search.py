@@ -0,0 +1,56 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connections, router
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import Cast
+from rest_framework.exceptions import ValidationError
+
+SEARCH_CONFIG = 'english'
+
+
+class SearchVectorMixin:
+    """
+    Keeps a model's `search_vector` column in sync with `search_source_field`.
+    The tsvector is computed in the same INSERT/UPDATE that writes the text; other backends leave it NULL.
+    """
+    search_source_field = None
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or self.search_source_field in update_fields:
+            using = kwargs.get('using') or router.db_for_write(self.__class__, instance=self)
+            if connections[using].vendor == 'postgresql':
+                text = getattr(self, self.search_source_field) or ''
+                self.search_vector = SearchVector(Value(text), config=SEARCH_CONFIG)
+                if update_fields is not None:
+                    kwargs['update_fields'] = {*update_fields, 'search_vector'}
+
+        super().save(*args, **kwargs)
+        self.__dict__.pop('search_vector', None)  # never read back, leave it deferred instead of holding the expression
+
+
+def ranked_search(queryset, source_field, query):
+    """
+    Filters to the rows matching `query` and annotates a `rank` (higher is better).
+    PostgreSQL matches the GIN indexed search_vector; other backends fall back to an unranked icontains per term.
+    """
+    if connections[queryset.db].vendor == 'postgresql':
+        search_query = SearchQuery(query, config=SEARCH_CONFIG, search_type='websearch')
+        # ts_rank() returns a float4; as double precision the value survives the round trip through a cursor exactly.
+        rank = Cast(SearchRank(F('search_vector'), search_query), FloatField())
+        return queryset.filter(search_vector=search_query).annotate(rank=rank)
+
+    for term in query.split():
+        queryset = queryset.filter(**{f'{source_field}__icontains': term})
+    return queryset.annotate(rank=Value(1.0, output_field=FloatField()))
+
+
+def get_search_query(request):
+    query = request.query_params.get('q', '').strip()
+    if not query:
+        raise ValidationError(
+            {
+                'success': False,
+                'message': 'Enter a search query in the "q" parameter.'
+            }
+        )
+    return query
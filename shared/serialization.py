@@ -0,0 +1,176 @@
+"""
+Compiled read-only serializers.
+
+compile_serializer() turns the fields of a DRF serializer into one generated function, `to_dict(obj, request)`,
+that builds the same dict as serializer.data with plain attribute reads: no per-field get_attribute() /
+to_representation() dispatch and no SerializerMethodField lookups. Method fields have no generic equivalent and
+must be given as Python expressions over `obj` and `request`, e.g. likes_count='obj.likes_count'.
+"""
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+from rest_framework.settings import api_settings
+
+_datetime_field = serializers.DateTimeField()
+
+
+def _str(value):
+    return None if value is None else str(value)
+
+
+def _datetime(value):
+    return None if value is None else _datetime_field.to_representation(value)
+
+
+def _file_url(value, request):
+    # FileField.to_representation()
+    if not value:
+        return None
+    if not api_settings.UPLOADED_FILES_USE_URL:
+        return value.name
+    try:
+        url = value.url
+    except AttributeError:
+        return None
+    if request is not None:
+        return request.build_absolute_uri(url)
+    return url
+
+
+def _field_expression(serializer_class, field_name, field, namespace):
+    source = f'obj.{field.source}'
+    if isinstance(field, serializers.ListSerializer):
+        # Related managers, like ListSerializer.to_representation(); prefetched rows are read from the cache.
+        nested = compile_serializer(type(field.child)).to_dict
+        namespace[f'_{field_name}'] = nested
+        return f'[_{field_name}(item, request) for item in {source}.all()]'
+    if isinstance(field, serializers.BaseSerializer):
+        nested = compile_serializer(type(field)).to_dict
+        namespace[f'_{field_name}'] = nested
+        return f'None if (value := {source}) is None else _{field_name}(value, request)'
+    if isinstance(field, serializers.PrimaryKeyRelatedField):
+        # Rendered as the raw pk, like PKOnlyObject; JSON renderers turn UUIDs into strings.
+        return f'obj.{serializer_class.Meta.model._meta.get_field(field.source).attname}'
+    if isinstance(field, serializers.FileField):
+        return f'_file_url({source}, request)'
+    if isinstance(field, serializers.DateTimeField):
+        return f'_datetime({source})'
+    if isinstance(field, (serializers.UUIDField, serializers.CharField)):
+        return f'_str({source})'
+    if isinstance(field, (serializers.BooleanField, serializers.IntegerField)):
+        return source
+    raise TypeError(f'{serializer_class.__name__}.{field_name}: {type(field).__name__} cannot be compiled; '
+                    f'pass an expression for it.')
+
+
+class CompiledSerializer:
+    """Read-only stand-in for the serializer it was compiled from: takes (instance, many, context), exposes .data."""
+    to_dict = None
+
+    def __init__(self, instance=None, many=False, context=None, **kwargs):
+        self.instance = instance
+        self.many = many
+        self.context = context or {}
+
+    @property
+    def data(self):
+        to_dict = self.to_dict
+        request = self.context.get('request')
+        if self.many:
+            return [to_dict(obj, request) for obj in self.instance]
+        return to_dict(self.instance, request)
+
+
+def compile_serializer(serializer_class, **expressions):
+    name = f'{serializer_class.__name__}_to_dict'
+    namespace = {'_str': _str, '_datetime': _datetime, '_file_url': _file_url}
+    items = []
+    for field_name, field in serializer_class().fields.items():
+        if field.write_only:
+            continue
+        if field_name in expressions:
+            expression = expressions[field_name]
+        else:
+            expression = _field_expression(serializer_class, field_name, field, namespace)
+        items.append(f'        {field_name!r}: {expression},')
+
+    source = '\n'.join([f'def {name}(obj, request):', '    return {', *items, '    }'])
+    exec(compile(source, f'<compiled {serializer_class.__name__}>', 'exec'), namespace)
+    # Expressions can call the function recursively by its name, e.g. for nested replies.
+    return type(f'Compiled{serializer_class.__name__}', (CompiledSerializer,), {
+        'to_dict': staticmethod(namespace[name]),
+        'source': source,
+    })
+
+
+class ReadSerializerMixin:
+    """Serializes GET responses with `read_serializer_class`; writes keep going through `serializer_class`."""
+    read_serializer_class = None
+
+    def get_serializer_class(self):
+        if self.request.method == 'GET' and self.read_serializer_class is not None:
+            return self.read_serializer_class
+        return super().get_serializer_class()
+
+
+def compact_rows(rows, fields=None, authors=None, nested=('replies',)):
+    """
+    Applies ?fields= and ?expand=author to serialized rows and to the rows nested under the `nested` keys
+    (replies). Other lists, such as a post's media, are values and stay intact.
+    With `authors` (a dict) every nested author is replaced by its id and collected there once.
+    """
+    compacted = []
+    for row in rows:
+        if fields is not None:
+            row = {key: value for key, value in row.items() if key in fields}
+        else:
+            row = dict(row)
+        author = row.get('author')
+        if authors is not None and isinstance(author, dict):
+            authors[author['id']] = author
+            row['author'] = author['id']
+        for key in nested:
+            if row.get(key):
+                row[key] = compact_rows(row[key], fields, authors, nested)
+        compacted.append(row)
+    return compacted
+
+
+class CompactResponseMixin:
+    """
+    Optional slimmer GET responses:
+    ?fields=id,caption keeps only those keys of each row;
+    ?expand=author side-loads authors: rows carry the author id and a top-level `authors` map holds each author once.
+    Paginated responses keep their shape and gain `authors`; with ?expand= plain lists and single objects are
+    wrapped as {'result': ..., 'authors': {...}}.
+    """
+    expandable = ('author',)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        fields = request.query_params.get('fields')
+        expand = request.query_params.get('expand')
+        if expand and expand not in self.expandable:
+            raise ValidationError({'expand': f'Supported values: {", ".join(self.expandable)}.'})
+        self.compact_fields = set(fields.split(',')) if fields else None
+        self.expand = expand or None
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        compact_fields, expand = getattr(self, 'compact_fields', None), getattr(self, 'expand', None)
+        if request.method != 'GET' or response.status_code != 200 or (compact_fields is None and expand is None):
+            return response
+
+        authors = {} if expand == 'author' else None
+        data = response.data
+        if isinstance(data, dict) and isinstance(data.get('result'), list):  # paginated
+            data = {**data, 'result': compact_rows(data['result'], compact_fields, authors)}
+        elif isinstance(data, list):
+            data = compact_rows(data, compact_fields, authors)
+            data = data if authors is None else {'result': data}
+        else:
+            data = compact_rows([data], compact_fields, authors)[0]
+            data = data if authors is None else {'result': data}
+        if authors is not None:
+            data['authors'] = authors
+        response.data = data
+        return response
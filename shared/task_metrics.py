@@ -0,0 +1,109 @@
+"""
+Celery queue depth and task latency.
+
+Producers stamp each message with its publish time; workers add every task's queue wait and run time to per-queue
+counters in the TASK_METRICS_CACHE. Unless tasks run eagerly that cache must be shared by workers and web processes
+(Redis at REDIS_URL); check_metrics_cache() stops the startup otherwise.
+"""
+import time
+
+from celery.signals import before_task_publish, task_prerun, task_postrun
+from django.conf import settings
+from django.core.cache import caches
+from kombu.exceptions import OperationalError
+
+from .caches import require_shared_cache
+
+PUBLISHED_AT_HEADER = 'published_at'
+COUNTERS = ('tasks', 'failures', 'wait_ms', 'runtime_ms')
+
+
+def metrics_cache():
+    return caches[getattr(settings, 'TASK_METRICS_CACHE', 'default')]
+
+
+def check_metrics_cache():
+    # Eager tasks run in the process that sends them; otherwise the counters are written by the worker processes.
+    if not getattr(settings, 'CELERY_TASK_ALWAYS_EAGER', False):
+        require_shared_cache('TASK_METRICS_CACHE', 'default', 'Unless CELERY_TASK_ALWAYS_EAGER is set')
+
+
+def queue_of(task):
+    delivery_info = task.request.delivery_info or {}
+    return delivery_info.get('routing_key') or task.app.amqp.router.route({}, task.name)['queue'].name
+
+
+def add(queue, **counters):
+    cache = metrics_cache()
+    for name, value in counters.items():
+        key = f'task-metrics:{queue}:{name}'
+        cache.add(key, 0, timeout=None)
+        cache.incr(key, value)
+
+
+@before_task_publish.connect
+def stamp_published_at(headers=None, **kwargs):
+    headers[PUBLISHED_AT_HEADER] = time.time()
+
+
+@task_prerun.connect
+def start_timer(task=None, **kwargs):
+    task.request.started_at = time.time()
+
+
+@task_postrun.connect
+def record_latency(task=None, state=None, **kwargs):
+    started_at = getattr(task.request, 'started_at', None)
+    if started_at is None:
+        return
+    # Eagerly applied tasks are never published, so they have no queue wait.
+    published_at = getattr(task.request, PUBLISHED_AT_HEADER, None) or started_at
+    add(
+        queue_of(task),
+        tasks=1,
+        failures=int(state == 'FAILURE'),
+        wait_ms=max(0, round((started_at - published_at) * 1000)),
+        runtime_ms=round((time.time() - started_at) * 1000),
+    )
+
+
+def queue_names(app):
+    routes = app.conf.task_routes or {}
+    return sorted({app.conf.task_default_queue, *(route['queue'] for route in routes.values() if 'queue' in route)})
+
+
+def queue_depths(app):
+    """Messages waiting in each queue, None for queues the broker does not know (yet)."""
+    depths = {}
+    with app.connection_for_read() as connection:
+        connection.ensure_connection(max_retries=1)
+        channel = connection.channel()
+        for name in queue_names(app):
+            try:
+                depths[name] = app.amqp.queues[name].bind(channel).queue_declare(passive=True).message_count
+            except connection.channel_errors:  # also closes the channel
+                depths[name] = None
+                channel = connection.channel()
+    return depths
+
+
+def task_metrics(app):
+    cache = metrics_cache()
+    try:
+        depths = queue_depths(app)
+    except OperationalError:
+        depths = {}
+
+    metrics = {}
+    for queue in queue_names(app):
+        counters = cache.get_many([f'task-metrics:{queue}:{name}' for name in COUNTERS])
+        values = {name: counters.get(f'task-metrics:{queue}:{name}', 0) for name in COUNTERS}
+        tasks = values['tasks']
+        metrics[queue] = {
+            'depth': depths.get(queue),
+            'tasks': tasks,
+            'failures': values['failures'],
+            'avg_wait_ms': round(values['wait_ms'] / tasks, 3) if tasks else 0.0,
+            'avg_runtime_ms': round(values['runtime_ms'] / tasks, 3) if tasks else 0.0,
+        }
+    return metrics
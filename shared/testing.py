@@ -0,0 +1,36 @@
+"""
+Helpers for the test suites.
+"""
+import json
+from unittest import skipUnless
+
+from django.db import connection, connections, transaction
+
+requires_postgresql = skipUnless(connection.vendor == 'postgresql', 'Query plans are only checked on PostgreSQL.')
+
+
+def plan_nodes(node):
+    yield node
+    for child in node.get('Plans', []):
+        yield from plan_nodes(child)
+
+
+def plan_problems(queryset, index_order=True):
+    """
+    EXPLAINs the queryset and lists its sequential scans, and its sorts when `index_order` says an index should
+    provide the order. Both are disabled while planning, so whatever survives has no index to use instead,
+    however small the test tables are.
+    """
+    with transaction.atomic(using=queryset.db):
+        with connections[queryset.db].cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('SET LOCAL enable_sort = off')
+        plan = json.loads(queryset.explain(format='json'))[0]['Plan']
+
+    problems = []
+    for node in plan_nodes(plan):
+        if node['Node Type'] == 'Seq Scan':
+            problems.append(f'sequential scan on {node["Relation Name"]}')
+        elif index_order and node['Node Type'] in ('Sort', 'Incremental Sort'):
+            problems.append(f'sort on {", ".join(node.get("Sort Key", []))}')
+    return problems
@@ -1,3 +1,425 @@
-from django.test import TestCase
+import gzip
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps
+from django.contrib.postgres.indexes import OpClass, PostgresIndex
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, connections
+from django.db.migrations.loader import MigrationLoader
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.permissions import AllowAny
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory, force_authenticate
+from rest_framework.views import APIView
+from celery.contrib.testing.worker import start_worker
+
+from instagram_clone.celery import app
+from posts.models import Hashtag, Post, PostLike
+from users.models import CustomUser
+from . import db_router, models, task_metrics
+from .caches import PER_PROCESS_CACHES
+from .middleware import CompressionMiddleware, brotli
+from .models import uuid7
+from .operations import HashPartition
+from .renderers import dumps
+from .serialization import compact_rows
+from .testing import requires_postgresql
+
+
+class ModelStateTests(SimpleTestCase):
+    def test_model_indexes_are_portable(self):
+        # PostgreSQL-only indexes belong in PostgreSQLOnly migrations: SQLite re-creates the indexes of the model
+        # state whenever it rebuilds a table.
+        for model in apps.get_models():
+            for index in model._meta.indexes:
+                with self.subTest(f'{model._meta.label}.{index.name}'):
+                    self.assertNotIsInstance(index, PostgresIndex)
+                    self.assertFalse(index.opclasses)
+                    self.assertFalse(any(isinstance(expression, OpClass) for expression in index.expressions))
+
+
+@requires_postgresql
+class HashPartitionTests(TransactionTestCase):
+    def setUp(self):
+        self.author = CustomUser.objects.create(username='liker', email='liker@example.com', auth_type='via_email')
+        for _ in range(3):
+            self.like()
+
+    def like(self):
+        post = Post.objects.create(author=self.author, image='post_images/liked.jpg', caption='liked')
+        return PostLike.objects.create(author=self.author, post=post)
+
+    def rebuild(self, forwards):
+        state = MigrationLoader(connection).project_state(('posts', '0009_partition_likes'))
+        operation = HashPartition('postlike', 'post', partitions=16)
+        with connection.schema_editor(atomic=False) as schema_editor:
+            if forwards:
+                operation.database_forwards('posts', schema_editor, state, state)
+            else:
+                operation.database_backwards('posts', schema_editor, state, state)
+
+    def table(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT count(*) FROM pg_inherits WHERE inhparent = 'posts_postlike'::regclass")
+            partitions = cursor.fetchone()[0]
+            cursor.execute("SELECT indexname FROM pg_indexes WHERE tablename = 'posts_postlike'")
+            indexes = {name for name, in cursor.fetchall()}
+            cursor.execute("SELECT to_regclass('posts_postlike__new'), to_regproc('posts_postlike__mirror')")
+            leftovers = [name for name in cursor.fetchone() if name]
+        return partitions, indexes, leftovers
+
+    @override_settings(PARTITION_COPY_BATCH_SIZE=2)
+    def test_rebuild_keeps_writes_made_during_it(self):
+        copy_rows = HashPartition.copy_rows
+        expected = []
+
+        def copy_while_writing(operation, *args):
+            self.like()  # mirrored by the trigger, then found by the copy
+            copy_rows(operation, *args)
+            PostLike.objects.order_by('id').first().delete()  # copied, then deleted through the trigger
+            PostLike.objects.filter(id=PostLike.objects.order_by('id').last().id).update(updated_at=timezone.now())
+            expected.append(set(PostLike.objects.values_list('id', 'post_id', 'updated_at')))
+
+        indexes = {'posts_postlike_pkey', 'post_likes_post_created_idx', 'PostLike Constraint'}
+        for forwards, partitions in ((False, 0), (True, 16)):
+            with self.subTest(forwards=forwards), \
+                    mock.patch.object(HashPartition, 'copy_rows', autospec=True, side_effect=copy_while_writing):
+                self.rebuild(forwards)
+                self.assertEqual(self.table(), (partitions, indexes, []))
+                self.assertEqual(set(PostLike.objects.values_list('id', 'post_id', 'updated_at')), expected[-1])
+
+    def test_failed_copy_drops_the_new_table(self):
+        with mock.patch.object(HashPartition, 'copy_rows', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.rebuild(forwards=False)
+        self.assertEqual(self.table()[::2], (16, []))
+        self.assertEqual(PostLike.objects.count(), 3)
+
+    def test_requires_a_non_atomic_migration(self):
+        state = MigrationLoader(connection).project_state(('posts', '0009_partition_likes'))
+        with connection.schema_editor() as schema_editor, self.assertRaisesMessage(ValueError, 'atomic = False'):
+            HashPartition('postlike', 'post', partitions=16).database_backwards('posts', schema_editor, state, state)
+
+
+class UUID7Tests(SimpleTestCase):
+    now = 1_760_000_000_000  # milliseconds
+
+    def setUp(self):
+        patcher = mock.patch.object(models, '_uuid7_last', [0, 0])  # the last millisecond and counter handed out
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_version_and_variant(self):
+        for value in (uuid7(), uuid7(timezone.now())):
+            self.assertEqual((value.version, value.variant), (7, uuid.RFC_4122))
+
+    def test_monotonic_within_a_millisecond(self):
+        with mock.patch('time.time_ns', return_value=self.now * 1_000_000):
+            ids = [uuid7() for _ in range(1000)]
+        self.assertEqual(ids, sorted(set(ids)))
+        self.assertEqual({value.int >> 80 for value in ids}, {self.now})
+        self.assertEqual([(value.int >> 64) & 0xFFF for value in ids], list(range(1000)))
+
+    def test_counter_overflow_borrows_the_next_millisecond(self):
+        with mock.patch('time.time_ns', return_value=self.now * 1_000_000):
+            ids = [uuid7() for _ in range(0x1000 + 2)]
+        self.assertEqual(ids, sorted(set(ids)))
+        self.assertEqual([value.int >> 80 for value in ids[-3:]], [self.now, self.now + 1, self.now + 1])
+
+    def test_clock_going_back_keeps_order(self):
+        with mock.patch('time.time_ns', side_effect=[self.now * 1_000_000, (self.now - 5) * 1_000_000]):
+            first, second = uuid7(), uuid7()
+        self.assertLess(first, second)
+
+    def test_explicit_timestamp(self):
+        timestamp = datetime.fromisoformat('2024-05-17T12:30:15.250+00:00')
+        value = uuid7(timestamp)
+        self.assertEqual(value.int >> 80, int(timestamp.timestamp() * 1000))
+        self.assertLess(value, uuid7(timestamp + timedelta(milliseconds=1)))
+        self.assertEqual(models._uuid7_last, [0, 0])  # backdated ids leave the counter alone
+
+
+class CompactRowsTests(SimpleTestCase):
+    rows = [{
+        'id': 1,
+        'author': {'id': 'a', 'username': 'ann'},
+        'media': [{'id': 10, 'position': 0}, {'id': 11, 'position': 1}],
+        'replies': [{'id': 2, 'author': {'id': 'b', 'username': 'bob'}, 'media': [], 'replies': None}],
+    }]
+
+    def test_fields_filter_rows_and_replies_only(self):
+        self.assertEqual(compact_rows(self.rows, {'id', 'media', 'replies'}), [{
+            'id': 1,
+            'media': [{'id': 10, 'position': 0}, {'id': 11, 'position': 1}],
+            'replies': [{'id': 2, 'media': [], 'replies': None}],
+        }])
+
+    def test_expand_collects_nested_authors(self):
+        authors = {}
+        rows = compact_rows(self.rows, authors=authors)
+        self.assertEqual((rows[0]['author'], rows[0]['replies'][0]['author']), ('a', 'b'))
+        self.assertEqual(sorted(authors), ['a', 'b'])
+
+
+class DumpsTests(SimpleTestCase):
+    def test_same_bytes_as_json_renderer(self):
+        data = {'text': 'Ünïcödé 🙂 \u2028 \u2029 "quoted"', 'counts': [0, -1, 2 ** 63 - 1], 1: None}
+        self.assertEqual(dumps(data), JSONRenderer().render(data))
+
+    def test_ints_wider_than_64_bits(self):
+        data = {'big': 2 ** 64, 'negative': -2 ** 70}
+        self.assertEqual(dumps(data), JSONRenderer().render(data))
+
+
+class CompressionMiddlewareTests(SimpleTestCase):
+    body = dumps([{'id': i, 'caption': 'a caption that repeats'} for i in range(100)])
+
+    def respond(self, accept_encoding, body=None, content_type='application/json', **headers):
+        response = HttpResponse(self.body if body is None else body, content_type=content_type, headers=headers)
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING=accept_encoding)
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def test_negotiation(self):
+        cases = {
+            '': None,
+            'identity': None,
+            'gzip': 'gzip',
+            'gzip;q=0': None,
+            'gzip;q=0.5, br;q=0.8': 'br',
+            'gzip;q=0.9, br;q=0.8': 'gzip',
+            'gzip, br': 'br',
+            'br;q=0, *': 'gzip',
+            '*': 'br',
+            '*;q=0': None,
+            'gzip;q=bad': None,
+        }
+        for header, encoding in cases.items():
+            with self.subTest(header):
+                expected = 'gzip' if encoding == 'br' and brotli is None else encoding
+                self.assertEqual(self.respond(header).get('Content-Encoding'), expected)
+
+    def test_content_round_trips(self):
+        response = self.respond('gzip')
+        self.assertEqual(gzip.decompress(response.content), self.body)
+        self.assertEqual(response['Content-Length'], str(len(response.content)))
+        if brotli is not None:
+            self.assertEqual(brotli.decompress(self.respond('br').content), self.body)
+
+    def test_size_threshold(self):
+        with override_settings(COMPRESSION_MIN_SIZE=len(self.body) + 1):
+            self.assertFalse(self.respond('gzip').has_header('Content-Encoding'))
+        with override_settings(COMPRESSION_MIN_SIZE=len(self.body)):
+            self.assertEqual(self.respond('gzip')['Content-Encoding'], 'gzip')
+
+    def test_vary(self):
+        self.assertEqual(self.respond('gzip')['Vary'], 'Accept-Encoding')
+        # The response depends on Accept-Encoding even when this client got it uncompressed.
+        self.assertEqual(self.respond('')['Vary'], 'Accept-Encoding')
+        self.assertEqual(self.respond('gzip', Vary='Authorization')['Vary'], 'Authorization, Accept-Encoding')
+
+    def test_etag_weakened(self):
+        self.assertEqual(self.respond('gzip', ETag='"abc"')['ETag'], 'W/"abc"')
+        self.assertEqual(self.respond('gzip', ETag='W/"abc"')['ETag'], 'W/"abc"')
+        self.assertEqual(self.respond('', ETag='"abc"')['ETag'], '"abc"')
+
+    def test_only_json(self):
+        # HTML pages carry CSRF tokens: compressing them would expose the tokens to BREACH.
+        for content_type in ('text/html; charset=utf-8', 'application/javascript', 'text/plain'):
+            with self.subTest(content_type):
+                response = self.respond('gzip, br', content_type=content_type)
+                self.assertFalse(response.has_header('Content-Encoding'))
+                self.assertEqual(response.content, self.body)
+        response = self.respond('gzip', content_type='application/json; charset=utf-8')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+    def test_already_encoded(self):
+        response = self.respond('gzip', **{'Content-Encoding': 'identity'})
+        self.assertEqual((response['Content-Encoding'], response.content), ('identity', self.body))
+
+
+class HashtagNamesView(db_router.ReplicaReadMixin, APIView):
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        return Response(list(Hashtag.objects.values_list('name', flat=True)))
+
+    def post(self, request):
+        return Response(status=201)
+
+
+@override_settings(DATABASE_REPLICAS=['replica_1'], REPLICA_HEALTH_CHECK_INTERVAL=0)
+class PrimaryReplicaRouterTests(TransactionTestCase):
+    """
+    The primary is the test database, the replica a second SQLite database holding other rows, so each response
+    shows where it was read from. TestCase would hide the routing: reads inside a transaction stay on the primary.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Added once the test runner and the test case have set up the connections they know. Like the replicas
+        # in settings it is a test mirror of the primary, so TransactionTestCase doesn't flush it.
+        cls.replica_dir = tempfile.TemporaryDirectory()
+        connections.settings = connections.configure_settings({**connections.settings, 'replica_1': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': str(Path(cls.replica_dir.name, 'db.sqlite3')),
+            'TEST': {'MIRROR': 'default'},
+        }})
+        cls.databases = cls.databases | {'replica_1'}
+        with connections['replica_1'].schema_editor() as editor:
+            editor.create_model(Hashtag)
+        Hashtag.objects.using('replica_1').create(name='from-replica')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica_1'].close()
+        del connections['replica_1']
+        del connections.settings['replica_1']
+        cls.replica_dir.cleanup()
+
+    def setUp(self):
+        Hashtag.objects.create(name='from-primary')
+        self.user = CustomUser.objects.create(username='reader', email='reader@example.com', auth_type='via_email')
+        db_router._next_check.clear()
+        db_router._healthy.clear()
+
+    def request(self, method):
+        request = getattr(APIRequestFactory(), method)('/')
+        force_authenticate(request, user=self.user)
+        return HashtagNamesView.as_view()(request)
+
+    def test_reads_go_to_the_replica(self):
+        self.assertEqual(self.request('get').data, ['from-replica'])
+
+    def test_reads_stick_to_the_primary_after_a_write(self):
+        self.assertEqual(self.request('post').status_code, 201)
+        self.assertEqual(self.request('get').data, ['from-primary'])
+        with override_settings(REPLICA_STICKY_SECONDS=0):  # the window has passed
+            self.request('post')
+        self.assertEqual(self.request('get').data, ['from-replica'])
+
+    def test_unhealthy_replica_falls_back_to_the_primary(self):
+        replica = connections['replica_1']
+        name = replica.settings_dict['NAME']
+        replica.close()
+        replica.settings_dict['NAME'] = str(Path(self.replica_dir.name, 'missing', 'db.sqlite3'))
+        try:
+            self.assertEqual(self.request('get').data, ['from-primary'])
+        finally:
+            replica.close()
+            replica.settings_dict['NAME'] = name
+        self.assertEqual(self.request('get').data, ['from-replica'])  # checked again after the interval
+
+
+REDIS_CACHE = {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://cache'}
+
+
+class SharedCacheCheckTests(SimpleTestCase):
+    def test_per_process_caches(self):
+        for backend in PER_PROCESS_CACHES:
+            caches = {'replica_sticky': {'BACKEND': backend}, 'task_metrics': {'BACKEND': backend}}
+            with self.subTest(backend), override_settings(CACHES=caches):
+                with override_settings(DATABASE_REPLICAS=['replica_1']), self.assertRaises(ImproperlyConfigured):
+                    db_router.check_sticky_cache()
+                with override_settings(CELERY_TASK_ALWAYS_EAGER=False), self.assertRaises(ImproperlyConfigured):
+                    task_metrics.check_metrics_cache()
+
+    def test_shared_caches_or_single_process(self):
+        with override_settings(DATABASE_REPLICAS=['replica_1'], CELERY_TASK_ALWAYS_EAGER=False,
+                               CACHES={'replica_sticky': REDIS_CACHE, 'task_metrics': REDIS_CACHE}):
+            db_router.check_sticky_cache()
+            task_metrics.check_metrics_cache()
+        with override_settings(DATABASE_REPLICAS=[], CELERY_TASK_ALWAYS_EAGER=True):
+            db_router.check_sticky_cache()
+            task_metrics.check_metrics_cache()
+
+
+@app.task(name='shared.tests.succeed', ignore_result=True)
+def succeed():
+    pass
+
+
+@app.task(name='shared.tests.fail', ignore_result=True)
+def fail():
+    raise ValueError('expected by the test')
+
+
+@override_settings(CELERY_TASK_ALWAYS_EAGER=False, CELERY_BROKER_URL='memory://')
+class TaskMetricsTests(SimpleTestCase):
+    """Routes, priorities and counters against kombu's in-memory broker and an in-process worker."""
+    maxDiff = None
+    routes = {
+        'users.tasks.send_phone_verification_code': ('notifications', 9),
+        'users.tasks.send_email_verification_code': ('notifications', 8),
+        'posts.tasks.extract_post_entities': ('default', 5),
+        'posts.tasks.process_post_media': ('default', 5),
+        'posts.tasks.purge_post_task': ('bulk', 3),
+        'posts.tasks.purge_comments_task': ('bulk', 3),
+        'posts.tasks.refresh_trending_posts': ('bulk', 5),
+        'shared.tests.succeed': ('default', 5),
+    }
+
+    def setUp(self):
+        task_metrics.metrics_cache().clear()
+
+    def tearDown(self):
+        for queue in task_metrics.queue_names(app):  # the in-memory broker outlives the test
+            with app.connection_for_write() as connection:
+                connection.SimpleQueue(queue).clear()
+        # Publishing created connection pools for memory://, let the next test pick its broker again.
+        app._pool = None
+        app.amqp._producer_pool = None
+
+    def published(self):
+        messages = {}
+        with app.connection_for_read() as connection:
+            for queue_name in task_metrics.queue_names(app):
+                queue = connection.SimpleQueue(queue_name)
+                while queue.qsize():
+                    message = queue.get(timeout=1)
+                    messages[message.headers['task']] = (queue_name, message.properties['priority'], message.headers)
+                    message.ack()
+                queue.close()
+        return messages
+
+    def test_routes_priorities_and_published_at(self):
+        before = time.time()
+        for name in self.routes:
+            app.send_task(name)
+        self.assertEqual(task_metrics.queue_depths(app), {'bulk': 3, 'default': 3, 'notifications': 2})
+
+        messages = self.published()
+        self.assertEqual({name: (queue, priority) for name, (queue, priority, _) in messages.items()}, self.routes)
+        for name, (_, _, headers) in messages.items():
+            with self.subTest(name):
+                self.assertGreaterEqual(headers[task_metrics.PUBLISHED_AT_HEADER], before)
+
+    def test_worker_counters(self):
+        succeed.delay()
+        succeed.delay()
+        fail.delay()
+        with start_worker(app, pool='solo', perform_ping_check=False, queues=['default'], shutdown_timeout=10):
+            deadline = time.monotonic() + 10
+            while task_metrics.task_metrics(app)['default']['tasks'] < 3 and time.monotonic() < deadline:
+                time.sleep(0.05)
+
+        metrics = task_metrics.task_metrics(app)
+        self.assertEqual(metrics['default']['depth'], 0)
+        self.assertEqual((metrics['default']['tasks'], metrics['default']['failures']), (3, 1))
+        self.assertGreater(metrics['default']['avg_wait_ms'], 0)  # published before the worker started
+        self.assertEqual(metrics['bulk']['tasks'], 0)
+
+    @override_settings(CELERY_TASK_ALWAYS_EAGER=True)
+    def test_eager_tasks_have_no_wait(self):
+        succeed.delay()
+        metrics = task_metrics.task_metrics(app)['default']
+        self.assertEqual((metrics['tasks'], metrics['failures'], metrics['avg_wait_ms']), (1, 0, 0.0))
@@ -1,5 +1,4 @@
 import re
-import threading
 import phonenumbers
 from django.core.mail import EmailMessage
 from django.template.loader import render_to_string
@@ -35,18 +34,19 @@ def check_user_input(user_input):
     return user_input
 
 
-class EmailThread(threading.Thread):
-    def __init__(self, email):
-        super().__init__()
-        self.email = email
+def normalize_phone_number(phone_number):
+    # Phone numbers are stored in E.164 (+998901234567) so that equality lookups hit the unique index.
+    try:
+        phone_number_obj = phonenumbers.parse(phone_number)
+    except phonenumbers.NumberParseException:
+        return phone_number
 
-    def run(self):
-        self.email.send()
+    return phonenumbers.format_number(phone_number_obj, phonenumbers.PhoneNumberFormat.E164)
 
 
 class Email:
     @staticmethod
-    def send_email(data):
+    def build_email(data):
         email = EmailMessage(
             subject=data['subject'],
             body=data['body'],
@@ -54,19 +54,17 @@ class Email:
         )
         if data.get('content_type') == 'html':
             email.content_subtype = 'html'
-        EmailThread(email).start()
+        return email
 
 
-def send_email(email, code):
+def verification_email_data(email, code):
     html_content = render_to_string(
         'email/authentication/activate_account.html',
         context={'code': code}
     )
-    Email.send_email(
-        {
-            'subject': 'Registration',
-            'body': html_content,
-            'to_email': email,
-            'content_type': 'html'
-        }
-    )
+    return {
+        'subject': 'Registration',
+        'body': html_content,
+        'to_email': email,
+        'content_type': 'html'
+    }
@@ -1,3 +1,42 @@
-from django.shortcuts import render
+from django.db import connections
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
-# Create your views here.
+from .task_metrics import task_metrics
+
+
+def pool_metrics(connection):
+    pool = getattr(connection, 'pool', None)
+    if pool is None:
+        return {'pooled': False, 'conn_max_age': connection.settings_dict['CONN_MAX_AGE']}
+
+    stats = pool.get_stats()
+    in_use = stats['pool_size'] - stats['pool_available']
+    requests = stats.get('requests_num', 0)
+    return {
+        'pooled': True,
+        'utilization': round(in_use / stats['pool_max'], 3),
+        'in_use': in_use,
+        'waiting': stats.get('requests_waiting', 0),
+        'avg_wait_ms': round(stats.get('requests_wait_ms', 0) / requests, 3) if requests else 0.0,
+        'stats': stats,
+    }
+
+
+class DatabasePoolMetricsAPIView(APIView):
+    """Connection pool usage of this worker process, per database. Counters are cumulative since the process started."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response({alias: pool_metrics(connections[alias]) for alias in connections})
+
+
+class TaskMetricsAPIView(APIView):
+    """Depth of each Celery queue and the average wait and run time of the tasks consumed from it."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        from instagram_clone.celery import app
+
+        return Response(task_metrics(app))
@@ -1,9 +1,36 @@
+import uuid
+
 from django.contrib import admin
+
+from shared.admin import LargeTableAdmin
 from .models import CustomUser, UserConfirmation
 
 
-class CustomUserModelAdmin(admin.ModelAdmin):
+class CustomUserModelAdmin(LargeTableAdmin):
     list_display = ['id', 'username', 'email', 'phone_number']
+    search_fields = ['username']
+
+    def get_search_results(self, request, queryset, search_term):
+        # Exact matches on the lookup indexes; a trailing * searches username prefixes.
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        try:
+            return queryset.filter(pk=uuid.UUID(term)), False
+        except ValueError:
+            pass
+        if '@' in term[1:]:
+            return queryset.by_email(term), False
+        if term.startswith('+'):
+            return queryset.by_phone_number(term), False
+        if term.endswith('*'):
+            return queryset.by_username_prefix(term.rstrip('*').lstrip('@')), False
+        return queryset.by_username(term.lstrip('@')), False
+
+
+class UserConfirmationAdmin(LargeTableAdmin):
+    list_select_related = ['user']
+
 
 admin.site.register(CustomUser, CustomUserModelAdmin)
-admin.site.register(UserConfirmation)
\ No newline at end of file
+admin.site.register(UserConfirmation, UserConfirmationAdmin)
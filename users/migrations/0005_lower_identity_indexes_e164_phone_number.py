@@ -0,0 +1,49 @@
+# Generated by Django 5.1.4 on 2026-10-19 12:08
+
+import django.db.models.functions.text
+import users.models
+from django.db import migrations, models
+
+from shared.utils import normalize_phone_number
+
+
+def normalize_phone_numbers(apps, schema_editor):
+    CustomUser = apps.get_model('users', 'CustomUser')
+    users = []
+    for user in CustomUser.objects.exclude(phone_number=None).only('id', 'phone_number').iterator():
+        phone_number = normalize_phone_number(user.phone_number)
+        if phone_number != user.phone_number:
+            user.phone_number = phone_number
+            users.append(user)
+    CustomUser.objects.bulk_update(users, ['phone_number'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0004_alter_customuser_photo'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='customuser',
+            managers=[
+                ('objects', users.models.CustomUserManager()),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='customuser',
+            name='phone_number',
+            field=models.CharField(blank=True, max_length=16, null=True, unique=True),
+        ),
+        migrations.RunPython(normalize_phone_numbers, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(django.db.models.functions.text.Lower('email'), name='users_email_lower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(django.db.models.functions.text.Lower('username'), name='users_username_lower_idx'),
+        ),
+    ]
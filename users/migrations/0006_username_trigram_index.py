@@ -0,0 +1,24 @@
+# Generated by Django 5.1.4 on 2026-10-19 12:12
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+from shared.operations import PostgreSQLOnly
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0005_lower_identity_indexes_e164_phone_number'),
+    ]
+
+    operations = [
+        TrigramExtension(),  # no-op on other backends
+        PostgreSQLOnly(migrations.AddIndex(
+            model_name='customuser',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Lower('username'), name='gin_trgm_ops'), name='users_username_trgm_idx'),
+        )),
+    ]
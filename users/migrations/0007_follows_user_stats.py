@@ -0,0 +1,56 @@
+# Generated by Django 5.1.4 on 2026-10-19 12:21
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def create_user_stats(apps, schema_editor):
+    CustomUser = apps.get_model('users', 'CustomUser')
+    UserStats = apps.get_model('users', 'UserStats')
+    Post = apps.get_model('posts', 'Post')
+
+    posts = Post.objects.filter(author=OuterRef('pk')).order_by().values('author').annotate(count=Count('*')).values('count')
+    counts = CustomUser.objects.order_by().annotate(post_count=Coalesce(Subquery(posts), 0)).values_list('id', 'post_count')
+    UserStats.objects.bulk_create(
+        (UserStats(user_id=user_id, post_count=post_count) for user_id, post_count in counts.iterator(chunk_size=5000)),
+        batch_size=5000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_username_trigram_index'),
+        ('posts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('post_count', models.PositiveIntegerField(default=0)),
+                ('follower_count', models.PositiveIntegerField(default=0)),
+                ('following_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UserFollow',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('follower', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='following', to=settings.AUTH_USER_MODEL)),
+                ('following', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='followers', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['following', '-created_at'], name='user_follows_followers_idx')],
+                'constraints': [models.UniqueConstraint(fields=('follower', 'following'), name='UserFollow Constraint'), models.CheckConstraint(condition=models.Q(('follower', models.F('following')), _negated=True), name='UserFollow not self')],
+            },
+        ),
+        migrations.RunPython(create_user_stats, migrations.RunPython.noop),
+    ]
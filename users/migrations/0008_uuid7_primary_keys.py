@@ -0,0 +1,33 @@
+# Generated by Django 5.1.4 on 2026-10-19 12:38
+
+import shared.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0007_follows_user_stats'),
+    ]
+
+    # Only the Python-side default changes, so the database is left alone (SQLite would otherwise rebuild
+    # every table). Existing version-4 ids stay valid.
+    operations = [
+        migrations.SeparateDatabaseAndState(state_operations=[
+            migrations.AlterField(
+                model_name='customuser',
+                name='id',
+                field=models.UUIDField(default=shared.models.uuid7, editable=False, primary_key=True, serialize=False, unique=True),
+            ),
+            migrations.AlterField(
+                model_name='userconfirmation',
+                name='id',
+                field=models.UUIDField(default=shared.models.uuid7, editable=False, primary_key=True, serialize=False, unique=True),
+            ),
+            migrations.AlterField(
+                model_name='userfollow',
+                name='id',
+                field=models.UUIDField(default=shared.models.uuid7, editable=False, primary_key=True, serialize=False, unique=True),
+            ),
+        ]),
+    ]
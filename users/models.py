@@ -1,17 +1,60 @@
 from django.core.validators import FileExtensionValidator
-from django.db import models
-from django.contrib.auth.models import AbstractUser
+from django.db import models, transaction, IntegrityError
+from django.contrib.auth.models import AbstractUser, UserManager
+from django.db.models.functions import Lower
 from django.utils.translation import gettext as _
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth.hashers import is_password_usable
 
-from shared.models import BaseModel
+from shared.models import BaseModel, DirtyFieldsMixin
+from shared.utils import normalize_phone_number
 from datetime import datetime, timedelta
 import random
 import uuid
 
 
-class CustomUser(AbstractUser, BaseModel):
+USERNAME_GENERATION_ATTEMPTS = 3
+
+
+class CustomUserQuerySet(models.QuerySet):
+    # These lookups match the functional Lower() indexes exactly, unlike __iexact which compiles to UPPER() on PostgreSQL.
+    def by_email(self, email):
+        return self.alias(email_lower=Lower('email')).filter(email_lower=email.lower())
+
+    def by_username(self, username):
+        return self.alias(username_lower=Lower('username')).filter(username_lower=username.lower())
+
+    def get_by_username(self, username):
+        # Usernames are unique as typed, not case-insensitively: an exact match wins over users whose name differs
+        # only in case, which by_username() would pick between arbitrarily.
+        return self.filter(username=username).first_unordered() or self.by_username(username).first_unordered()
+
+    def by_usernames(self, usernames):
+        return self.alias(username_lower=Lower('username')).filter(username_lower__in={username.lower() for username in usernames})
+
+    def by_phone_number(self, phone_number):
+        return self.filter(phone_number=normalize_phone_number(phone_number))
+
+    def by_username_prefix(self, prefix):
+        return self.alias(username_lower=Lower('username')).filter(username_lower__startswith=prefix.lower())
+
+    def with_profile(self, viewer=None):
+        if viewer is not None and viewer.is_authenticated:
+            viewer_follows = models.Exists(UserFollow.objects.filter(follower=viewer, following=models.OuterRef('pk')))
+        else:
+            viewer_follows = models.Value(False)
+        return self.select_related('stats').annotate(viewer_follows=viewer_follows)
+
+    def first_unordered(self):
+        # first() adds ORDER BY id, which can steer the planner away from the lookup index.
+        return next(iter(self[:1]), None)
+
+
+class CustomUserManager(UserManager.from_queryset(CustomUserQuerySet)):
+    pass
+
+
+class CustomUser(DirtyFieldsMixin, AbstractUser, BaseModel):
     class UserRoles(models.TextChoices):
         ORDINARY_USER = "ordinary_user", _("Ordinary User")
         MANAGER = "manager", _("Manager")
@@ -32,10 +75,20 @@ class CustomUser(AbstractUser, BaseModel):
     auth_type = models.CharField(max_length=31, choices=AuthTypes.choices)
     auth_status = models.CharField(max_length=31, choices=AuthStatus.choices, default=AuthStatus.NEW.value)
     email = models.EmailField(null=True, blank=True, unique=True)
-    phone_number = models.CharField(max_length=13, null=True, blank=True, unique=True)
+    phone_number = models.CharField(max_length=16, null=True, blank=True, unique=True)  # E.164
     photo = models.ImageField(upload_to="user_images/", null=True, blank=True,
                               validators=[FileExtensionValidator(allowed_extensions=['jpg', 'jpeg', 'png', 'tiff', 'heic', 'heif'])])
 
+    objects = CustomUserManager()
+
+    class Meta(AbstractUser.Meta):
+        # PostgreSQL also has users_username_trgm_idx, a trigram GIN index on LOWER(username) serving
+        # by_username_prefix() (LOWER(username) LIKE 'abc%'); migration 0006 creates it outside the model state.
+        indexes = [
+            models.Index(Lower('email'), name='users_email_lower_idx'),
+            models.Index(Lower('username'), name='users_username_lower_idx'),
+        ]
+
     @property
     def full_name(self):
         return f"{self.first_name} {self.last_name}"
@@ -51,12 +104,12 @@ class CustomUser(AbstractUser, BaseModel):
         return code
 
 
-    def check_username(self):
-        if not self.username:
-            temp_username = f"instagram-{uuid.uuid4().__str__().split("-")[-1]}"
-            while CustomUser.objects.filter(username=temp_username):
-                temp_username = f"{temp_username}{random.randint(0, 9)}"
-            self.username = temp_username
+    def generate_username(self, attempt=0):
+        # Derived from the primary key, so generated usernames never collide with each other.
+        # Only a user who manually picked the same handle can clash, in which case a random one is used.
+        if attempt == 0:
+            return f"instagram-{self.pk.hex}"
+        return f"instagram-{uuid.uuid4().hex}"
 
 
     def check_email(self):
@@ -65,6 +118,11 @@ class CustomUser(AbstractUser, BaseModel):
             self.email = normalize_email
 
 
+    def check_phone_number(self):
+        if self.phone_number:
+            self.phone_number = normalize_phone_number(self.phone_number)
+
+
     def check_pass(self):
         if not self.password:
             temp_password = f"password-{uuid.uuid4().__str__().split("-")[-1]}"
@@ -85,16 +143,42 @@ class CustomUser(AbstractUser, BaseModel):
 
 
     def save(self, *args, **kwargs):
-        # Run validation before saving
-        self.clean()
-        super(CustomUser, self).save(*args, **kwargs)
-
-
-    def clean(self):
-        self.check_email()
-        self.check_username()
-        self.check_pass()
-        self.hash_password()
+        # Run validation before saving. Updates only normalize the fields that are actually written.
+        if self._state.adding:
+            self.clean()
+        else:
+            update_fields = kwargs.get('update_fields')
+            self.clean(fields=update_fields if update_fields is not None else self.get_dirty_fields())
+
+        if self._state.adding and not self.username:
+            self.save_with_generated_username(*args, **kwargs)
+        else:
+            super(CustomUser, self).save(*args, **kwargs)
+
+
+    def save_with_generated_username(self, *args, **kwargs):
+        # Relies on the unique index instead of checking the username with a query before inserting.
+        for attempt in range(USERNAME_GENERATION_ATTEMPTS):
+            self.username = self.generate_username(attempt)
+            try:
+                with transaction.atomic():
+                    super(CustomUser, self).save(*args, **kwargs)
+                return
+            except IntegrityError:
+                if not CustomUser.objects.filter(username=self.username).exists():
+                    raise
+        self.username = ""
+        raise IntegrityError("Could not generate a unique username.")
+
+
+    def clean(self, fields=None):
+        if fields is None or 'email' in fields:
+            self.check_email()
+        if fields is None or 'phone_number' in fields:
+            self.check_phone_number()
+        if fields is None or 'password' in fields:
+            self.check_pass()
+            self.hash_password()
 
 
     def __str__(self):
@@ -130,3 +214,46 @@ class UserConfirmation(BaseModel):
                 self.expiration_time = datetime.now() + timedelta(minutes=PHONE_EXPIRATION_MINUTES)
 
         super(UserConfirmation, self).save(*args, **kwargs)
+
+
+class UserFollow(BaseModel):
+    follower = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='following')
+    following = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='followers')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['follower', 'following'], name='UserFollow Constraint'),
+            models.CheckConstraint(condition=~models.Q(follower=models.F('following')), name='UserFollow not self'),
+        ]
+        indexes = [
+            models.Index(fields=['following', '-created_at'], name='user_follows_followers_idx'),
+        ]
+
+
+class UserStats(models.Model):
+    # Counters kept up to date by users.signals and posts.signals; rebuild() recounts them from scratch.
+    user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    post_count = models.PositiveIntegerField(default=0)
+    follower_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+
+    @classmethod
+    def rebuild(cls, users=None):
+        from posts.models import Post, count_subquery
+
+        users = CustomUser.objects.all() if users is None else users
+        counts = users.order_by().annotate(
+            post_count=count_subquery(Post.objects.all(), 'author'),
+            follower_count=count_subquery(UserFollow.objects.all(), 'following'),
+            following_count=count_subquery(UserFollow.objects.all(), 'follower'),
+        ).values_list('id', 'post_count', 'follower_count', 'following_count')
+        cls.objects.bulk_create(
+            [cls(user_id=user_id, post_count=posts, follower_count=followers, following_count=following)
+             for user_id, posts, followers, following in counts],
+            update_conflicts=True, unique_fields=['user'],
+            update_fields=['post_count', 'follower_count', 'following_count'], batch_size=5000,
+        )
+
+    @classmethod
+    def add(cls, user_id, **deltas):
+        cls.objects.filter(user_id=user_id).update(**{field: models.F(field) + delta for field, delta in deltas.items()})
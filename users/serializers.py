@@ -2,17 +2,17 @@ from django.contrib.auth import authenticate
 from django.contrib.auth.models import update_last_login
 from django.contrib.auth.password_validation import validate_password
 from django.core.validators import FileExtensionValidator
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 from rest_framework.response import Response
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
 from rest_framework_simplejwt.tokens import AccessToken
 
-from .models import CustomUser, UserConfirmation, VIA_EMAIL, VIA_PHONE
+from .models import CustomUser, UserConfirmation, UserStats, VIA_EMAIL, VIA_PHONE
 from rest_framework import serializers, status
-from django.db.models import Q
 from rest_framework.exceptions import ValidationError, PermissionDenied, NotFound
-from shared.utils import check_user_input, send_email
-from users.tasks import send_phone_verification_code
+from shared.utils import check_user_input
+from users.tasks import dispatch_verification_code
 
 
 class SignUpSerializer(serializers.ModelSerializer):
@@ -24,14 +24,16 @@ class SignUpSerializer(serializers.ModelSerializer):
 
 
     def create(self, validated_data):
-        user = super(SignUpSerializer, self).create(validated_data)
-        if user.auth_type == VIA_EMAIL:
-            code = user.create_verification_code(VIA_EMAIL)
-            send_email(user.email, code)
-        elif user.auth_type == VIA_PHONE:
-            code = user.create_verification_code(VIA_PHONE)
-            send_phone_verification_code.delay(user.phone_number, code)
-        user.save()
+        # The user, the confirmation and the outbox message that sends the code commit together.
+        with transaction.atomic():
+            user = super(SignUpSerializer, self).create(validated_data)
+            if user.auth_type == VIA_EMAIL:
+                code = user.create_verification_code(VIA_EMAIL)
+                recipient = user.email
+            elif user.auth_type == VIA_PHONE:
+                code = user.create_verification_code(VIA_PHONE)
+                recipient = user.phone_number
+            dispatch_verification_code(user.auth_type, recipient, code)
         return user
 
 
@@ -88,14 +90,14 @@ class SignUpSerializer(serializers.ModelSerializer):
 
     def validate_email_or_phone_number(self, value):
         value = value.lower()
-        if value and check_user_input(value) == "email" and CustomUser.objects.filter(email=value).exists():
+        if value and check_user_input(value) == "email" and CustomUser.objects.by_email(value).exists():
             result = {
                 'success': False,
                 'message': "A user with this email already exists."
             }
             raise ValidationError(result)
 
-        elif value and check_user_input(value) == "phone_number" and CustomUser.objects.filter(phone_number=value).exists():
+        elif value and check_user_input(value) == "phone_number" and CustomUser.objects.by_phone_number(value).exists():
             result = {
                 'success': False,
                 'message': "A user with this phone number already exists."
@@ -149,6 +151,16 @@ class ChangeUserDataSerializer(serializers.Serializer):
                 }
             )
 
+        users = CustomUser.objects.by_username(username)
+        if self.instance is not None:
+            users = users.exclude(id=self.instance.id)
+        if users.exists():
+            raise ValidationError(
+                {
+                    'message': 'This username is already taken'
+                }
+            )
+
         return username
 
 
@@ -191,14 +203,13 @@ class LoginSerializer(TokenObtainPairSerializer):
 
     def auth_validate(self, data):
         user_input = data.get('user_input')  # username|email|phone_number
-        if check_user_input(user_input) == 'username':
-            username = user_input
-        elif check_user_input(user_input) == 'email':
-            user = self.get_user(email__iexact=user_input)
-            username = user.username
-        elif check_user_input(user_input) == 'phone_number':
-            user = self.get_user(phone_number=user_input)
-            username = user.username
+        input_type = check_user_input(user_input)
+        if input_type == 'username':
+            current_user = self.get_user(CustomUser.objects.get_by_username(user_input))
+        elif input_type == 'email':
+            current_user = self.get_user(CustomUser.objects.by_email(user_input).first_unordered())
+        elif input_type == 'phone_number':
+            current_user = self.get_user(CustomUser.objects.by_phone_number(user_input).first_unordered())
         else:
             error = {
                 'success': False,
@@ -207,12 +218,10 @@ class LoginSerializer(TokenObtainPairSerializer):
             raise ValidationError(error)
 
         authentication_kwargs = {
-            self.username_field: username,
+            self.username_field: current_user.username,
             'password': data['password']
         }
 
-        current_user = self.get_user(username=username)
-
         if current_user.auth_status in [CustomUser.AuthStatus.NEW, CustomUser.AuthStatus.CODE_VERIFIED]:
             raise ValidationError(
                 {
@@ -240,16 +249,15 @@ class LoginSerializer(TokenObtainPairSerializer):
 
 
     @staticmethod
-    def get_user(**kwargs):
-        users = CustomUser.objects.filter(**kwargs)
-        if not users.exists():
+    def get_user(user):
+        if user is None:
             raise ValidationError(
                 {
                     'message': 'No active account found'
                 }
             )
 
-        return users.first()
+        return user
 
 
 
@@ -280,11 +288,18 @@ class ForgotPasswordSerializer(serializers.Serializer):
                 }
             )
 
-        user = CustomUser.objects.filter(Q(email=email_or_phone) | Q(phone_number=email_or_phone))
-        if not user.exists():
+        input_type = check_user_input(email_or_phone)
+        if input_type == 'email':
+            user = CustomUser.objects.by_email(email_or_phone).first_unordered()
+        elif input_type == 'phone_number':
+            user = CustomUser.objects.by_phone_number(email_or_phone).first_unordered()
+        else:
+            user = None
+
+        if user is None:
             raise NotFound(detail="User not found")
 
-        attrs['user'] = user.first()
+        attrs['user'] = user
 
         return attrs
 
@@ -323,3 +338,25 @@ class ResetPasswordSerializer(serializers.ModelSerializer):
         return instance
 
 
+class UserSearchSerializer(serializers.ModelSerializer):
+    id = serializers.UUIDField(read_only=True)
+
+    class Meta:
+        model = CustomUser
+        fields = ('id', 'username', 'photo')
+
+
+class UserStatsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UserStats
+        fields = ('post_count', 'follower_count', 'following_count')
+
+
+class ProfileSerializer(serializers.ModelSerializer):
+    id = serializers.UUIDField(read_only=True)
+    stats = UserStatsSerializer(read_only=True)
+    viewer_follows = serializers.BooleanField(read_only=True)
+
+    class Meta:
+        model = CustomUser
+        fields = ('id', 'username', 'first_name', 'last_name', 'photo', 'stats', 'viewer_follows')
@@ -0,0 +1,23 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import CustomUser, UserFollow, UserStats
+
+
+@receiver(post_save, sender=CustomUser)
+def user_created(sender, instance, created, **kwargs):
+    if created:
+        UserStats.objects.create(user=instance)
+
+
+@receiver(post_save, sender=UserFollow)
+def user_followed(sender, instance, created, **kwargs):
+    if created:
+        UserStats.add(instance.follower_id, following_count=1)
+        UserStats.add(instance.following_id, follower_count=1)
+
+
+@receiver(post_delete, sender=UserFollow)
+def user_unfollowed(sender, instance, **kwargs):
+    UserStats.add(instance.follower_id, following_count=-1)
+    UserStats.add(instance.following_id, follower_count=-1)
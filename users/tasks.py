@@ -2,6 +2,9 @@ from instagram_clone.celery import app
 from decouple import config
 from twilio.rest import Client
 
+from shared.outbox import enqueue
+from shared.utils import Email, verification_email_data
+
 
 @app.task()
 def send_phone_verification_code(phone_number, code):
@@ -17,3 +20,15 @@ def send_phone_verification_code(phone_number, code):
         body=f'Your instagram verification code: {code}'
     )
 
+
+@app.task()
+def send_email_verification_code(email, code):
+    Email.build_email(verification_email_data(email, code)).send()
+
+
+def dispatch_verification_code(verification_type, recipient, code):
+    # Call inside the transaction that creates the code, so the code is only sent if it is saved.
+    if verification_type == 'via_email':
+        enqueue(send_email_verification_code, recipient, code)
+    elif verification_type == 'via_phone':
+        enqueue(send_phone_verification_code, recipient, code)
@@ -1,3 +1,135 @@
+from django.db import connection
+from django.db.models.signals import post_save
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 
-# Create your tests here.
+from shared.testing import plan_problems, requires_postgresql
+from .models import CustomUser, UserFollow
+
+
+def create_user(username, password='secret-password-1', **kwargs):
+    user = CustomUser(
+        username=username,
+        auth_type=CustomUser.AuthTypes.VIA_EMAIL,
+        auth_status=CustomUser.AuthStatus.DONE,
+        **kwargs,
+    )
+    user.set_password(password)
+    user.save()
+    return user
+
+
+class LoginTests(TestCase):
+    def login(self, user_input, password='secret-password-1'):
+        return self.client.post(reverse('login'), {'user_input': user_input, 'password': password})
+
+    def test_exact_username_wins_over_other_casings(self):
+        usernames = ['ZedUser', 'zeduser', 'ZEDUSER', 'zedUser']  # a case-insensitive lookup picks one for all
+        for username in usernames:
+            create_user(username, password=f'{username}-password')
+        for username in usernames:
+            with self.subTest(username):
+                self.assertEqual(self.login(username, f'{username}-password').status_code, 200)
+
+    def test_username_in_other_case(self):
+        create_user('ZedUser')
+        self.assertEqual(self.login('zeduser').status_code, 200)
+
+    def test_email_in_other_case(self):
+        create_user('zed-user', email='zed@example.com')
+        self.assertEqual(self.login('Zed@Example.com').status_code, 200)
+
+
+class ProfileTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = {username: create_user(username) for username in ('ZedUser', 'zeduser')}
+        cls.follower = create_user('follower')
+
+    def test_profile_of_exact_username(self):
+        for username in self.users:
+            with self.subTest(username):
+                response = self.client.get(reverse('profile', args=[username]))
+                self.assertEqual(response.json()['user']['username'], username)
+        self.assertEqual(self.client.get(reverse('profile', args=['ZEDUSER'])).status_code, 404)
+
+    def test_follow_exact_username(self):
+        token = self.follower.token()['access_token']
+        self.client.post(reverse('follow', args=['zeduser']), HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(list(UserFollow.objects.values_list('following__username', flat=True)), ['zeduser'])
+
+
+class DirtyFieldsSaveTests(TestCase):
+    """Updates only write and normalize the fields changed since the user was loaded."""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_user('zeduser', email='zed@example.com', first_name='Zed')
+        # Stored as an older version of the app left it, bypassing save() and its normalization.
+        CustomUser.objects.filter(username='zeduser').update(email='Zed@Example.com', phone_number='+998 901234567')
+
+    def save_and_capture_update(self, user):
+        with CaptureQueriesContext(connection) as queries:
+            user.save()
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        return updates[0]
+
+    def test_unchanged_user_is_still_saved(self):
+        received = []
+        post_save.connect(lambda **kwargs: received.append(kwargs), sender=CustomUser, weak=False,
+                          dispatch_uid='dirty-fields-test')
+        self.addCleanup(post_save.disconnect, sender=CustomUser, dispatch_uid='dirty-fields-test')
+
+        self.save_and_capture_update(CustomUser.objects.get(username='zeduser'))
+        self.assertEqual(len(received), 1)
+        self.assertFalse(received[0]['created'])
+
+    def test_only_dirty_fields_are_normalized_and_written(self):
+        user = CustomUser.objects.get(username='zeduser')
+        user.first_name = 'Zedd'
+        sql = self.save_and_capture_update(user)
+        self.assertIn('"first_name"', sql)
+        self.assertIn('"updated_at"', sql)
+        self.assertNotIn('"email"', sql)
+        self.assertNotIn('"password"', sql)
+        self.assertEqual(CustomUser.objects.values_list('email', 'phone_number').get(username='zeduser'),
+                         ('Zed@Example.com', '+998 901234567'))
+
+        user.email = 'New@Example.com'
+        self.assertNotIn('"phone_number"', self.save_and_capture_update(user))
+        self.assertEqual(CustomUser.objects.values_list('email', 'phone_number').get(username='zeduser'),
+                         ('new@example.com', '+998 901234567'))
+
+    def test_deferred_fields_are_not_written(self):
+        for changed in (True, False):
+            with self.subTest(changed=changed):
+                user = CustomUser.objects.defer('email', 'phone_number').get(username='zeduser')
+                if changed:
+                    user.first_name = 'Zedd'
+                sql = self.save_and_capture_update(user)
+                self.assertNotIn('"email"', sql)
+                self.assertNotIn('"phone_number"', sql)
+                self.assertEqual(user.get_deferred_fields(), {'email', 'phone_number'})
+
+
+@requires_postgresql
+class IdentityLookupPlanTests(TestCase):
+    """The identity lookups must be served by the unique and Lower() indexes, not by scanning the users table."""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_user('ZedUser', email='zed@example.com', phone_number='+998901234567')
+
+    def test_lookups_use_indexes(self):
+        lookups = {
+            'email': CustomUser.objects.by_email('Zed@Example.com'),
+            'username': CustomUser.objects.by_username('zeduser'),
+            'exact username': CustomUser.objects.filter(username='ZedUser'),
+            'usernames': CustomUser.objects.by_usernames(['zeduser', 'other']),
+            'phone number': CustomUser.objects.by_phone_number('+998 90 123 45 67'),
+        }
+        for name, queryset in lookups.items():
+            with self.subTest(name):
+                self.assertEqual(plan_problems(queryset[:1]), [])
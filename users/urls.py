@@ -13,4 +13,7 @@ urlpatterns = [
     path('new_verification_code/', views.GetNewVerificationCode.as_view(), name='new_code'),
     path('change_user_data/', views.ChangeUserDataAPIView.as_view(), name='change_user_data'),
     path('change_user_photo/', views.ChangeUserImageAPIView.as_view(), name='change_user_image'),
+    path('search/', views.UserSearchAPIView.as_view(), name='user_search'),
+    path('<str:username>/', views.ProfileAPIView.as_view(), name='profile'),
+    path('<str:username>/follow/', views.FollowAPIView.as_view(), name='follow'),
 ]
\ No newline at end of file
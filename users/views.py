@@ -1,6 +1,7 @@
 from datetime import datetime
 
 from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
 from rest_framework.exceptions import ValidationError, NotFound
 from rest_framework.generics import UpdateAPIView
 from rest_framework.permissions import IsAuthenticated, AllowAny
@@ -9,15 +10,20 @@ from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.exceptions import TokenError
 
 from .serializers import SignUpSerializer, ChangeUserDataSerializer, ChangeUserImageSerializer, LoginSerializer, \
-    LoginRefreshSerializer, LogoutSerializer, ForgotPasswordSerializer, ResetPasswordSerializer
-from .models import CustomUser
-from shared.utils import send_email, check_user_input
+    LoginRefreshSerializer, LogoutSerializer, ForgotPasswordSerializer, ResetPasswordSerializer, UserSearchSerializer, \
+    ProfileSerializer
+from .models import CustomUser, UserFollow
+from posts.models import Post
+from posts.serializers import PostGridSerializer
+from shared.utils import check_user_input
+from shared.custom_pagination import CustomCursorPagination
+from shared.search import get_search_query
 from rest_framework import permissions, generics
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework import status
 
-from .tasks import send_phone_verification_code
+from .tasks import dispatch_verification_code
 
 
 class SignUpUserAPIView(generics.CreateAPIView):
@@ -65,14 +71,16 @@ class GetNewVerificationCode(APIView):
         user = self.request.user
         self.check_verification(user)
         if user.auth_type == CustomUser.AuthTypes.VIA_EMAIL:
-            code = user.create_verification_code(CustomUser.AuthTypes.VIA_EMAIL.value)
-            send_email(user.email, code)
+            with transaction.atomic():
+                code = user.create_verification_code(CustomUser.AuthTypes.VIA_EMAIL.value)
+                dispatch_verification_code(CustomUser.AuthTypes.VIA_EMAIL, user.email, code)
             return Response(
                 {'success': True, "message": f"Your new verification code has been sent to {user.email}"}
             )
         elif user.auth_type == CustomUser.AuthTypes.VIA_PHONE:
-            code = user.create_verification_code(CustomUser.AuthTypes.VIA_PHONE.value)
-            send_phone_verification_code.delay(user.phone_number, code)
+            with transaction.atomic():
+                code = user.create_verification_code(CustomUser.AuthTypes.VIA_PHONE.value)
+                dispatch_verification_code(CustomUser.AuthTypes.VIA_PHONE, user.phone_number, code)
             return Response(
                 {'success': True, 'message': f'Your new verification code has been sent to {user.phone_number}'}
             )
@@ -174,8 +182,9 @@ class ForgotPasswordAPIView(APIView):
         user = serializer.validated_data.get('user')
 
         if check_user_input(email_or_phone) == 'phone_number':
-            code = user.create_verification_code(CustomUser.AuthTypes.VIA_PHONE)
-            send_phone_verification_code.delay(email_or_phone, code)
+            with transaction.atomic():
+                code = user.create_verification_code(CustomUser.AuthTypes.VIA_PHONE)
+                dispatch_verification_code(CustomUser.AuthTypes.VIA_PHONE, email_or_phone, code)
             return Response(
                 {
                     'success': True,
@@ -187,8 +196,9 @@ class ForgotPasswordAPIView(APIView):
             )
 
         elif check_user_input(email_or_phone) == 'email':
-            code = user.create_verification_code(CustomUser.AuthTypes.VIA_EMAIL)
-            send_phone_verification_code.delay(email_or_phone, code)
+            with transaction.atomic():
+                code = user.create_verification_code(CustomUser.AuthTypes.VIA_EMAIL)
+                dispatch_verification_code(CustomUser.AuthTypes.VIA_EMAIL, email_or_phone, code)
             return Response(
                 {
                     'success': True,
@@ -223,3 +233,69 @@ class ResetPasswordView(UpdateAPIView):
         except ObjectDoesNotExist as e:
             raise NotFound(detail="User not found")
 
+
+class UserSearchPagination(CustomCursorPagination):
+    ordering = 'username'
+
+
+class UserSearchAPIView(generics.ListAPIView):
+    serializer_class = UserSearchSerializer
+    permission_classes = [AllowAny]
+    pagination_class = UserSearchPagination
+
+    def get_queryset(self):
+        query = get_search_query(self.request)
+        return CustomUser.objects.by_username_prefix(query).only('id', 'username', 'photo')
+
+
+class ProfileAPIView(generics.ListAPIView):
+    """
+    The profile of /users/<username>/: user info with its precomputed counters, plus a page of the post grid.
+    The grid is paginated by keyset over the (author, -created_at) index; pass the `next` link to get older posts.
+    """
+    serializer_class = PostGridSerializer
+    permission_classes = [AllowAny]
+    pagination_class = CustomCursorPagination
+
+    def get_queryset(self):
+        self.user = CustomUser.objects.with_profile(self.request.user).filter(username=self.kwargs['username']).first_unordered()
+        if self.user is None:
+            raise NotFound(detail="User not found")
+        return Post.objects.filter(author=self.user).only('id', 'image', 'created_at')
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        response.data['user'] = ProfileSerializer(self.user, context={'request': request}).data
+        return response
+
+
+class FollowAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get_user(self, username):
+        user = CustomUser.objects.filter(username=username).only('id').first_unordered()
+        if user is None:
+            raise NotFound(detail="User not found")
+        if user.id == self.request.user.id:
+            raise ValidationError({'success': False, 'message': "You cannot follow yourself."})
+        return user
+
+    def post(self, request, username):
+        user = self.get_user(username)
+        _, created = UserFollow.objects.get_or_create(follower=request.user, following=user)
+        return Response(
+            {
+                'success': True,
+                'message': "You are now following this user." if created else "You already follow this user."
+            }, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
+        )
+
+    def delete(self, request, username):
+        user = self.get_user(username)
+        UserFollow.objects.filter(follower=request.user, following=user).delete()
+        return Response(
+            {
+                'success': True,
+                'message': "You unfollowed this user."
+            }, status=status.HTTP_204_NO_CONTENT
+        )